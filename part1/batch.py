@@ -0,0 +1,198 @@
+# part1/batch.py
+
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+
+# The rate limiter is shared with part2 and lives in the repository root, which
+# entry points put on the import path once for all modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import extract_ocr_text, extract_from_text
+from fields import localize, LANGUAGES
+from shared.rate_limit import request_priority, BATCH
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('batch.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+
+
+def collect_files(source: str) -> list:
+    """
+    Lists the forms to process from a directory (recursively) or a manifest
+    file with one path per line.
+    """
+    if os.path.isdir(source):
+        files = []
+        for root, _, names in os.walk(source):
+            for name in sorted(names):
+                if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    files.append(os.path.join(root, name))
+        return sorted(files)
+
+    with open(source, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def load_checkpoint(output_path: str, retry_failed: bool) -> set:
+    """
+    Reads the results written by a previous run and returns the files to skip.
+    A partially written last line from a crashed run is truncated.
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    with open(output_path, "rb") as f:
+        content = f.read()
+    if content and not content.endswith(b"\n"):
+        with open(output_path, "r+b") as f:
+            f.truncate(content.rfind(b"\n") + 1)
+        logger.warning("Truncated incomplete last record from previous run")
+
+    done = set()
+    for line in content.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("status") == "ok" or not retry_failed:
+            done.add(record["file"])
+    return done
+
+
+def ocr_worker(in_queue: queue.Queue, text_queue: queue.Queue, result_queue: queue.Queue):
+    while (file_path := in_queue.get()) is not None:
+        started = time.perf_counter()
+        try:
+            text, layout_fields, compaction = extract_ocr_text(file_path)
+        except Exception as e:
+            result_queue.put({"file": file_path, "status": "error", "stage": "ocr", "error": str(e)})
+            continue
+        text_queue.put((file_path, text, layout_fields, compaction, time.perf_counter() - started))
+
+
+def llm_worker(text_queue: queue.Queue, result_queue: queue.Queue, language: str):
+    while (item := text_queue.get()) is not None:
+        file_path, text, layout_fields, compaction, ocr_seconds = item
+        started = time.perf_counter()
+        try:
+            parsed_data, stats = extract_from_text(text, layout_fields)
+        except Exception as e:
+            result_queue.put({"file": file_path, "status": "error", "stage": "extraction", "error": str(e)})
+            continue
+        result_queue.put({
+            "file": file_path,
+            "status": "ok",
+            "language": language,
+            "data": localize(parsed_data, language),
+            "stats": stats,
+            "prompt_tokens_saved": compaction["prompt_tokens_saved"],
+            "compaction_warnings": compaction["warnings"],
+            "layout_fields": len(layout_fields),
+            "ocr_seconds": round(ocr_seconds, 3),
+            "llm_seconds": round(time.perf_counter() - started, 3),
+        })
+
+
+def _batch_priority(target):
+    def run(*args):
+        # Backfills yield Azure quota to interactive requests in the same process
+        with request_priority(BATCH):
+            target(*args)
+    return run
+
+
+def start_workers(count: int, target, *args) -> list:
+    threads = [threading.Thread(target=_batch_priority(target), args=args, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run_batch(files: list, output_path: str, ocr_workers: int, llm_workers: int, queue_size: int,
+              language: str = "en") -> dict:
+    """
+    Runs OCR and GPT extraction as two concurrent stages connected by bounded
+    queues and appends one JSON record per file to output_path.
+    """
+    in_queue = queue.Queue()
+    text_queue = queue.Queue(maxsize=queue_size)
+    result_queue = queue.Queue(maxsize=queue_size)
+
+    for file_path in files:
+        in_queue.put(file_path)
+    for _ in range(ocr_workers):
+        in_queue.put(None)
+
+    ocr_threads = start_workers(ocr_workers, ocr_worker, in_queue, text_queue, result_queue)
+    llm_threads = start_workers(llm_workers, llm_worker, text_queue, result_queue, language)
+
+    def close_stages():
+        for thread in ocr_threads:
+            thread.join()
+        for _ in range(llm_workers):
+            text_queue.put(None)
+        for thread in llm_threads:
+            thread.join()
+        result_queue.put(None)
+
+    threading.Thread(target=close_stages, daemon=True).start()
+
+    counts = {"ok": 0, "error": 0}
+    started = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as out:
+        while (record := result_queue.get()) is not None:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+
+            counts[record["status"]] += 1
+            processed = counts["ok"] + counts["error"]
+            elapsed = time.perf_counter() - started
+            if record["status"] == "error":
+                logger.error(f"Failed {record['file']} at {record['stage']}: {record['error']}")
+            logger.info(f"[{processed}/{len(files)}] {record['file']} - {processed / elapsed:.2f} files/s")
+
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk form extraction to JSONL.")
+    parser.add_argument("source", help="Directory of forms or manifest file with one path per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL output, also used as the resume checkpoint")
+    parser.add_argument("--ocr-workers", type=int, default=int(os.getenv("BATCH_OCR_WORKERS", "4")))
+    parser.add_argument("--llm-workers", type=int, default=int(os.getenv("BATCH_LLM_WORKERS", "4")))
+    parser.add_argument("--queue-size", type=int, default=16, help="Capacity of the queues between stages")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-process files that failed in a previous run")
+    parser.add_argument("--language", choices=LANGUAGES, default="en", help="Output keys: English, Hebrew or both")
+    args = parser.parse_args(argv)
+
+    files = collect_files(args.source)
+    done = load_checkpoint(args.output, args.retry_failed)
+    remaining = [file_path for file_path in files if file_path not in done]
+    logger.info(f"Found {len(files)} files, {len(files) - len(remaining)} already processed")
+    if not remaining:
+        return 0
+
+    summary = run_batch(remaining, args.output, args.ocr_workers, args.llm_workers, args.queue_size, args.language)
+    logger.info(f"Batch completed: {summary}")
+    return 0 if summary["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+# part1/benchmark.py
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pypdf import PdfWriter
+
+# The rate limiter is shared with part2 and lives in the repository root, which
+# entry points put on the import path once for all modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_servers import StubConfig, form_recognizer_app, openai_app, start_app
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+STAGES = ("ocr", "llm", "parse", "total")
+PERCENTILES = (50, 95, 99)
+
+
+def start_stub_servers(config: StubConfig) -> dict:
+    """
+    Runs both stub servers on an event loop in a background thread.
+    Returns their base URLs.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    urls = {}
+    for name, app in (("form", form_recognizer_app(config)), ("openai", openai_app(config))):
+        _, urls[name] = asyncio.run_coroutine_threadsafe(start_app(app), loop).result()
+    return urls
+
+
+def configure_environment(urls: dict, work_dir: str, use_cache: bool):
+    """
+    Points the pipeline at the stub servers. Must run before the pipeline is imported.
+    """
+    cache_enabled = "true" if use_cache else "false"
+    os.environ.update({
+        "AZURE_FORM_KEY": "stub",
+        "AZURE_FORM_ENDPOINT": urls["form"],
+        "AZURE_OPENAI_KEY": "stub",
+        "AZURE_OPENAI_ENDPOINT": urls["openai"],
+        "AZURE_OPENAI_API_VERSION": "2024-06-01",
+        "AZURE_OPENAI_DEPLOYMENT_NAME": "gpt-4o",
+        "OCR_CACHE_ENABLED": cache_enabled,
+        "OCR_CACHE_DIR": os.path.join(work_dir, "cache", "ocr"),
+        "LLM_CACHE_ENABLED": cache_enabled,
+        "LLM_CACHE_DIR": os.path.join(work_dir, "cache", "llm"),
+    })
+
+
+def make_corpus(directory: str, count: int, max_pages: int, duplicate_rate: float, seed: int) -> list:
+    """
+    Writes synthetic PDFs with 1..max_pages blank pages. A share of the files
+    are byte-identical resubmissions of earlier ones.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths, documents = [], []
+    for index in range(count):
+        if documents and rng.random() < duplicate_rate:
+            document = rng.choice(documents)
+        else:
+            writer = PdfWriter()
+            for _ in range(rng.randint(1, max_pages)):
+                writer.add_blank_page(width=612, height=792)
+            writer.add_metadata({"/Title": f"synthetic form {index}"})
+            buffer = tempfile.SpooledTemporaryFile()
+            writer.write(buffer)
+            buffer.seek(0)
+            document = buffer.read()
+            documents.append(document)
+        path = os.path.join(directory, f"form_{index:05d}.pdf")
+        with open(path, "wb") as f:
+            f.write(document)
+        paths.append(path)
+    return paths
+
+
+def process_one(pipeline, file_path: str) -> dict:
+    """
+    Runs one form through the pipeline stages and returns their durations.
+    """
+    timings = {}
+    started = time.perf_counter()
+    ocr_text, layout_fields, _ = pipeline.extract_ocr_text(file_path)
+    timings["ocr"] = time.perf_counter() - started
+
+    stage_started = time.perf_counter()
+    extracted_data = pipeline.request_fields(ocr_text, layout_fields)
+    timings["llm"] = time.perf_counter() - stage_started
+
+    stage_started = time.perf_counter()
+    pipeline.parse_extraction(extracted_data, layout_fields)
+    timings["parse"] = time.perf_counter() - stage_started
+
+    timings["total"] = time.perf_counter() - started
+    return timings
+
+
+def run_benchmark(pipeline, files: list, concurrency: int) -> dict:
+    """
+    Processes the corpus with a thread pool. Returns latency percentiles per
+    stage in milliseconds, throughput and memory usage.
+    """
+    samples = {stage: [] for stage in STAGES}
+    errors = 0
+
+    def task(file_path):
+        try:
+            return process_one(pipeline, file_path)
+        except Exception as e:
+            logger.error(f"Benchmark request failed for {file_path}: {str(e)}")
+            return None
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for timings in executor.map(task, files):
+            if timings is None:
+                errors += 1
+                continue
+            for stage in STAGES:
+                samples[stage].append(timings[stage])
+    elapsed = time.perf_counter() - started
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latency = {}
+    for stage, values in samples.items():
+        if values:
+            latency[stage] = {
+                f"p{percentile}": round(float(np.percentile(values, percentile)) * 1000, 1)
+                for percentile in PERCENTILES
+            }
+    return {
+        "forms": len(files),
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "throughput_forms_per_second": round((len(files) - errors) / elapsed, 3),
+        "latency_ms": latency,
+        "peak_python_memory_mb": round(peak_traced / 1024 / 1024, 1),
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(rss / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compares total latency percentiles and throughput against a baseline report.
+    """
+    regressions = []
+    for percentile in PERCENTILES:
+        key = f"p{percentile}"
+        current = report["latency_ms"].get("total", {}).get(key)
+        previous = baseline["latency_ms"].get("total", {}).get(key)
+        if current is not None and previous and current > previous * (1 + tolerance):
+            regressions.append(f"total {key} latency {current}ms vs baseline {previous}ms")
+    if report["throughput_forms_per_second"] < baseline["throughput_forms_per_second"] * (1 - tolerance):
+        regressions.append(
+            f"throughput {report['throughput_forms_per_second']} vs baseline {baseline['throughput_forms_per_second']} forms/s"
+        )
+    return regressions
+
+
+def print_report(report: dict):
+    print(f"Forms: {report['forms']} (errors: {report['errors']}), concurrency: {report['concurrency']}")
+    print(f"Throughput: {report['throughput_forms_per_second']} forms/s over {report['seconds']}s")
+    print(f"{'stage':<8}" + "".join(f"{f'p{p} ms':>12}" for p in PERCENTILES))
+    for stage, values in report["latency_ms"].items():
+        print(f"{stage:<8}" + "".join(f"{values[f'p{p}']:>12}" for p in PERCENTILES))
+    print(f"Peak Python memory: {report['peak_python_memory_mb']} MB, max RSS: {report['max_rss_mb']} MB")
+    print(f"Stub servers: {report['stub_counters']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the part1 pipeline against local stub servers.")
+    parser.add_argument("--forms", type=int, default=100, help="Number of synthetic forms")
+    parser.add_argument("--max-pages", type=int, default=3, help="Maximum pages per synthetic form")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="Share of resubmitted identical files")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cache", action="store_true", help="Enable the OCR and LLM caches")
+    parser.add_argument("--ocr-latency", type=float, default=1.5, help="Seconds per analyze operation")
+    parser.add_argument("--ocr-page-latency", type=float, default=0.5, help="Extra seconds per analyzed page")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Seconds before the first token")
+    parser.add_argument("--llm-token-latency", type=float, default=0.01, help="Seconds per generated token")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed regression against the baseline")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(
+        ocr_latency=args.ocr_latency,
+        ocr_page_latency=args.ocr_page_latency,
+        llm_latency=args.llm_latency,
+        llm_token_latency=args.llm_token_latency,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    urls = start_stub_servers(config)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        configure_environment(urls, work_dir, args.cache)
+        # Imported only now so the clients are built against the stub servers
+        import pipeline
+
+        files = make_corpus(os.path.join(work_dir, "forms"), args.forms, args.max_pages, args.duplicate_rate, args.seed)
+        report = run_benchmark(pipeline, files, args.concurrency)
+        report["stub_counters"] = dict(config.counters)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# part1/compaction.py
+
+import os
+import re
+import logging
+import threading
+from collections import Counter
+
+from gpt_extractor import build_prompt, DEPLOYMENT_NAME
+from shared.rate_limit import estimate_tokens
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAX_PROMPT_TOKENS = int(os.getenv("MAX_PROMPT_TOKENS", "6000"))
+# Cutting trailing lines can lose fields, so a prompt over budget is only reported unless this is set
+TRUNCATE_PROMPT = os.getenv("TRUNCATE_PROMPT", "false").lower() == "true"
+BOILERPLATE_FILE = os.getenv("OCR_BOILERPLATE_FILE")
+
+# Number of lines at the top and bottom of a page checked for repeated headers/footers
+HEADER_FOOTER_LINES = 3
+
+# Static text printed on the National Insurance form that never maps to an output field
+FORM_BOILERPLATE = [
+    r"המוסד לביטוח לאומי",
+    r"מינהל הביטוח והגמלאות",
+    r"בקשה למתן טיפול רפואי לנפגע עבודה\s*-?\s*עצמאי",
+    r"לכבוד",
+    r"קופת חולים\s*/?\s*בית חולים",
+    r"טופס זה (?:מיועד|ימולא).*",
+    r"(?:יש|נא) למלא .*",
+    r"(?:אני )?(?:מצהיר|מצהירה|מצהיר/ה) (?:בזה )?כי .*",
+    r"הצהרה",
+    r"הנני מבקש .*",
+    r"(?:ה)?שדות המסומנים .*",
+    r"\d{3}\s*\(\d{2}/\d{2}\)",
+]
+
+# Page numbering such as "עמוד 1 מתוך 2", "Page 1 of 2" or "- 1 -"
+PAGE_NUMBER = re.compile(r"(?:עמוד|page)\s*\d+(?:\s*(?:מתוך|of)\s*\d+)?|-\s*\d{1,3}\s*-", re.IGNORECASE)
+
+
+def _load_boilerplate() -> list:
+    patterns = list(FORM_BOILERPLATE)
+    if BOILERPLATE_FILE:
+        with open(BOILERPLATE_FILE, encoding="utf-8") as f:
+            patterns.extend(line.strip() for line in f if line.strip())
+    return [re.compile(pattern) for pattern in patterns]
+
+
+BOILERPLATE_PATTERNS = _load_boilerplate()
+
+# Loaded on first use, tiktoken reads its BPE ranks from disk or the network
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """
+    Returns the deployment's tiktoken encoding, or None when its BPE ranks
+    cannot be loaded (offline and not cached locally).
+    """
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    try:
+                        _encoding = tiktoken.encoding_for_model(DEPLOYMENT_NAME)
+                    except KeyError:
+                        # Azure deployment names do not always match a model name known to tiktoken
+                        _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    logger.warning(f"tiktoken encoding unavailable, estimating prompt tokens: {str(e)}")
+                    _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    # Without tiktoken data compaction works on the rate limiter's estimate rather than failing the form
+    return len(encoding.encode(text)) if encoding is not None else estimate_tokens(text)
+
+
+def _normalize(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _is_boilerplate(line: str) -> bool:
+    return any(pattern.fullmatch(line) for pattern in BOILERPLATE_PATTERNS)
+
+
+def _repeated_edge_lines(pages: list) -> set:
+    """
+    Finds header/footer lines that appear at the edges of more than one page.
+    """
+    counts = Counter()
+    for page in pages:
+        edges = page[:HEADER_FOOTER_LINES] + page[-HEADER_FOOTER_LINES:]
+        counts.update({_normalize(line) for line in edges})
+    return {line for line, count in counts.items() if count > 1}
+
+
+def compact_pages(pages: list, max_prompt_tokens: int = MAX_PROMPT_TOKENS, truncate: bool = TRUNCATE_PROMPT):
+    """
+    Removes form boilerplate, repeated headers/footers and page numbers from
+    OCR pages. A prompt still over the token budget is reported in the
+    report's warnings, and with truncate its trailing lines are cut until it fits.
+    Returns (text, report).
+    """
+    raw_text = "\n".join(line for page in pages for line in page)
+    tokens_before = count_tokens(build_prompt(raw_text))
+
+    repeated = _repeated_edge_lines(pages) if len(pages) > 1 else set()
+    seen_repeated = set()
+    lines = []
+    for page in pages:
+        for position, line in enumerate(page):
+            normalized = _normalize(line)
+            if not normalized or _is_boilerplate(normalized):
+                continue
+            at_edge = position < HEADER_FOOTER_LINES or position >= len(page) - HEADER_FOOTER_LINES
+            if at_edge and PAGE_NUMBER.fullmatch(normalized):
+                continue
+            if normalized in repeated:
+                if normalized in seen_repeated:
+                    continue
+                seen_repeated.add(normalized)
+            lines.append(normalized)
+
+    text = "\n".join(lines)
+    tokens_after = count_tokens(build_prompt(text))
+
+    warnings = []
+    truncated_lines = 0
+    if tokens_after > max_prompt_tokens and not truncate:
+        warnings.append(f"Prompt has {tokens_after} tokens, over the {max_prompt_tokens} token budget")
+    while truncate and tokens_after > max_prompt_tokens and lines:
+        # Drop the overflow in proportion to the excess, measured in lines
+        overflow = max(1, len(lines) * (tokens_after - max_prompt_tokens) // tokens_after)
+        del lines[-overflow:]
+        truncated_lines += overflow
+        text = "\n".join(lines)
+        tokens_after = count_tokens(build_prompt(text))
+    if truncated_lines:
+        warnings.append(f"Truncated {truncated_lines} OCR lines to fit the {max_prompt_tokens} token prompt budget")
+    for warning in warnings:
+        logger.warning(warning)
+
+    report = {
+        "prompt_tokens_before": tokens_before,
+        "prompt_tokens_after": tokens_after,
+        "prompt_tokens_saved": tokens_before - tokens_after,
+        "lines_dropped": sum(len(page) for page in pages) - len(lines),
+        "lines_truncated": truncated_lines,
+        "warnings": warnings,
+    }
+    logger.info(f"OCR text compaction: {report}")
+    return text, report
@@ -0,0 +1,134 @@
+# part1/fields.py
+
+import copy
+
+from schema import eng_form_template, he_form_template
+
+# Output languages: English keys, Hebrew keys, or both side by side
+LANGUAGES = ("en", "he", "both")
+
+
+def empty_form() -> dict:
+    """
+    Returns a fresh copy of the English output template with all fields empty.
+    """
+    return copy.deepcopy(eng_form_template)
+
+
+def set_path(data: dict, path: tuple, value):
+    """
+    Sets a value at a nested key path, creating intermediate dicts as needed.
+    """
+    for key in path[:-1]:
+        if not isinstance(data.get(key), dict):
+            data[key] = {}
+        data = data[key]
+    data[path[-1]] = value
+
+
+def field_paths(template: dict = eng_form_template, prefix: tuple = ()) -> list:
+    """
+    Lists the key paths of all leaf fields in a template, in template order.
+    """
+    paths = []
+    for key, value in template.items():
+        if isinstance(value, dict):
+            paths.extend(field_paths(value, prefix + (key,)))
+        else:
+            paths.append(prefix + (key,))
+    return paths
+
+
+def get_path(data: dict, path: tuple, default=None):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return default
+        data = data[key]
+    return data
+
+
+def subset_template(paths) -> dict:
+    """
+    Builds a template containing only the given field paths.
+    """
+    template = {}
+    for path in paths:
+        set_path(template, path, "")
+    return template
+
+
+def merge_fields(base: dict, update: dict) -> dict:
+    """
+    Recursively copies the fields of update into base.
+    """
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge_fields(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def _key_mapping(source: dict, target: dict, prefix: tuple = ()) -> dict:
+    """
+    Pairs the keys of two templates with the same structure by position.
+    Returns {source key path: target key}.
+    """
+    if len(source) != len(target):
+        raise ValueError(f"Templates differ in structure at {prefix}")
+    mapping = {}
+    for (key, value), (target_key, target_value) in zip(source.items(), target.items()):
+        mapping[prefix + (key,)] = target_key
+        if isinstance(value, dict):
+            mapping.update(_key_mapping(value, target_value, prefix + (key,)))
+    return mapping
+
+
+# Key path -> key in the other language, computed once from the two templates
+HEBREW_KEYS = _key_mapping(eng_form_template, he_form_template)
+ENGLISH_KEYS = _key_mapping(he_form_template, eng_form_template)
+
+
+def rename_keys(data: dict, mapping: dict, prefix: tuple = ()) -> dict:
+    """
+    Returns a copy of form data with its keys renamed through a key mapping.
+    Unknown keys are kept as they are.
+    """
+    renamed = {}
+    for key, value in data.items():
+        path = prefix + (key,)
+        renamed[mapping.get(path, key)] = rename_keys(value, mapping, path) if isinstance(value, dict) else value
+    return renamed
+
+
+def to_hebrew(data: dict) -> dict:
+    return rename_keys(data, HEBREW_KEYS)
+
+
+def to_english(data: dict) -> dict:
+    return rename_keys(data, ENGLISH_KEYS)
+
+
+def localize(data: dict, language: str = "en") -> dict:
+    """
+    Converts English-keyed form data to the requested output language.
+    "both" returns {"en": ..., "he": ...}.
+    """
+    if language == "en":
+        return data
+    if language == "he":
+        return to_hebrew(data)
+    if language == "both":
+        return {"en": data, "he": to_hebrew(data)}
+    raise ValueError(f"Unsupported output language: {language}")
+
+
+def english_data(data: dict, language: str = "en") -> dict:
+    """
+    Returns the English-keyed form data from output of the given language.
+    """
+    if language == "he":
+        return to_english(data)
+    if language == "both":
+        return data["en"]
+    return data
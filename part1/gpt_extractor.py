@@ -1,10 +1,18 @@
 # part1_form_extraction/gpt_extractor.py
 
-from openai import AzureOpenAI
 import os
+import re
+import json
 import logging
+import threading
+import unicodedata
 
-from schema import eng_form_template, structured_data_prompt_template
+import schema
+from schema import eng_form_template, structured_data_prompt_template, partial_data_prompt_template
+from fields import subset_template
+from cache import DiskCache, content_key, purge_stale_versions
+
+from shared.rate_limit import get_limiter, message_tokens
 
 from dotenv import load_dotenv
 
@@ -18,24 +26,122 @@ AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
 DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 
-if not all([AZURE_OPENAI_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_VERSION, DEPLOYMENT_NAME]):
-    logger.error("Missing required environment variables for Azure OpenAI")
-    raise ValueError("Missing required environment variables for Azure OpenAI")
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join("cache", "llm"))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "720"))
+
+# The OpenAI SDK is imported and the client built on first use,
+# so importing this module stays cheap and needs no credentials
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the shared Azure OpenAI client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not all([AZURE_OPENAI_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_VERSION, DEPLOYMENT_NAME]):
+                    logger.error("Missing required environment variables for Azure OpenAI")
+                    raise ValueError("Missing required environment variables for Azure OpenAI")
+                from openai import AzureOpenAI
+                try:
+                    # Retries are left to the shared rate limiter
+                    _client = AzureOpenAI(
+                        api_key=AZURE_OPENAI_KEY,
+                        api_version=AZURE_OPENAI_API_VERSION,
+                        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                        max_retries=0
+                    )
+                    logger.info("Successfully initialized Azure OpenAI client")
+                except Exception as e:
+                    logger.error(f"Failed to initialize Azure OpenAI client: {str(e)}")
+                    raise
+    return _client
+
 
-try:
-    client = AzureOpenAI(
-        api_key=AZURE_OPENAI_KEY,
-        api_version=AZURE_OPENAI_API_VERSION,
-        azure_endpoint=AZURE_OPENAI_ENDPOINT
+def _schema_version() -> str:
+    """
+    Fingerprint of the output template, the prompt and the schema.py source.
+    """
+    with open(schema.__file__, "rb") as f:
+        schema_source = f.read()
+    return content_key(
+        json.dumps(eng_form_template, sort_keys=True, ensure_ascii=False),
+        structured_data_prompt_template,
+        schema_source
     )
-    logger.info("Successfully initialized Azure OpenAI client")
-except Exception as e:
-    logger.error(f"Failed to initialize Azure OpenAI client: {str(e)}")
-    raise
 
-def extract_fields_from_text(raw_text: str) -> dict:
+
+SCHEMA_VERSION = _schema_version()
+
+# Created on first use, so importing this module neither scans nor writes the cache directory
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    Returns the LLM response cache, creating it on first use, or None when it is disabled.
+    """
+    global _llm_cache
+    if LLM_CACHE_ENABLED and _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                # Entries are grouped by schema version, so a schema or prompt change starts from an empty cache
+                purge_stale_versions(LLM_CACHE_DIR, SCHEMA_VERSION[:16])
+                _llm_cache = DiskCache(
+                    os.path.join(LLM_CACHE_DIR, SCHEMA_VERSION[:16]),
+                    LLM_CACHE_MAX_MB * 1024 * 1024,
+                    ttl=LLM_CACHE_TTL_HOURS * 3600
+                )
+    return _llm_cache
+
+
+def normalize_ocr_text(raw_text: str) -> str:
+    """
+    Normalizes unicode and whitespace so cosmetic OCR differences share a cache entry.
+    """
+    text = unicodedata.normalize("NFC", raw_text)
+    lines = (re.sub(r"\s+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def extraction_cache_key(raw_text: str, paths=None) -> str:
+    fields = json.dumps(sorted(paths), ensure_ascii=False) if paths else ""
+    return content_key(normalize_ocr_text(raw_text), SCHEMA_VERSION, DEPLOYMENT_NAME, fields)
+
+
+def build_prompt(raw_text: str, paths=None) -> str:
+    """
+    Builds the extraction prompt for all fields, or only for the given field paths.
+    """
+    if paths:
+        return partial_data_prompt_template.format(
+            raw_text=raw_text,
+            fields_template=subset_template(paths)
+        )
+    return structured_data_prompt_template.format(
+        raw_text=raw_text,
+        eng_form_template=eng_form_template
+    )
+
+
+def max_completion_tokens(paths=None) -> int:
+    # Field-specific requests only need room for the requested fields
+    if paths:
+        return min(4096, max(512, 96 * len(paths)))
+    return 4096
+
+
+def extract_fields_from_text(raw_text: str, paths=None) -> dict:
     """
     Extracting and filling all JSON field according to schema.
+    When paths is given only those fields are requested.
     """
     try:
         if not raw_text:
@@ -44,24 +150,92 @@ def extract_fields_from_text(raw_text: str) -> dict:
 
         logger.info("Starting field extraction from text")
 
-        prompt = structured_data_prompt_template.format(
-            raw_text=raw_text,
-            eng_form_template=eng_form_template
-        )
+        cache_key = extraction_cache_key(raw_text, paths)
+        llm_cache = get_llm_cache()
+        if llm_cache is not None:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"LLM cache hit ({llm_cache.stats()})")
+                return cached
+
+        messages = [{"role": "user", "content": build_prompt(raw_text, paths)}]
+        max_tokens = max_completion_tokens(paths)
 
         logger.info("Sending request to Azure OpenAI")
-        response = client.chat.completions.create(
+        response = get_limiter("openai").call(
+            get_client().chat.completions.create,
             model=DEPLOYMENT_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=4096,
+            messages=messages,
+            max_tokens=max_tokens,
             temperature=0.1,
             top_p=1.0,
+            tokens=message_tokens(messages, max_tokens),
         )
 
         result = response.choices[0].message.content
         logger.info("Successfully received response from Azure OpenAI")
+
+        if llm_cache is not None and result:
+            llm_cache.set(cache_key, result)
         return result
 
     except Exception as e:
         logger.error(f"Error during field extraction: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def stream_fields_from_text(raw_text: str, paths=None):
+    """
+    Streaming variant of extract_fields_from_text.
+    Yields the completion text in chunks as they arrive from Azure OpenAI.
+    """
+    try:
+        if not raw_text:
+            logger.warning("Empty text provided for field extraction")
+            yield "{}"
+            return
+
+        logger.info("Starting streaming field extraction from text")
+
+        cache_key = extraction_cache_key(raw_text, paths)
+        llm_cache = get_llm_cache()
+        if llm_cache is not None:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"LLM cache hit ({llm_cache.stats()})")
+                yield cached
+                return
+
+        messages = [{"role": "user", "content": build_prompt(raw_text, paths)}]
+        max_tokens = max_completion_tokens(paths)
+
+        logger.info("Sending streaming request to Azure OpenAI")
+        stream = get_limiter("openai").call(
+            get_client().chat.completions.create,
+            model=DEPLOYMENT_NAME,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.1,
+            top_p=1.0,
+            stream=True,
+            tokens=message_tokens(messages, max_tokens),
+        )
+
+        parts = []
+        for chunk in stream:
+            # Azure sends content-filter chunks without choices
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+
+        result = "".join(parts)
+        logger.info("Successfully received streamed response from Azure OpenAI")
+
+        if llm_cache is not None and result:
+            llm_cache.set(cache_key, result)
+
+    except Exception as e:
+        logger.error(f"Error during streaming field extraction: {str(e)}")
+        raise
@@ -0,0 +1,165 @@
+# part1/jobs.py
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import run_pipeline
+
+from shared.rate_limit import request_priority, BATCH
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+MAX_PENDING_JOBS = int(os.getenv("MAX_PENDING_JOBS", "500"))
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another submission."""
+
+
+class JobStore:
+    """
+    Persistent job store backed by SQLite, shared by the API and the workers.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    progress INTEGER NOT NULL,
+                    filename TEXT,
+                    file_path TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def create(self, filename: str, file_path: str) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, stage, progress, filename, file_path, created_at, updated_at) "
+                "VALUES (?, ?, ?, 0, ?, ?, ?, ?)",
+                (job_id, QUEUED, QUEUED, filename, file_path, now, now)
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+class JobQueue:
+    """
+    Bounded worker pool that runs the extraction pipeline for submitted jobs.
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, max_pending: int = MAX_PENDING_JOBS):
+        self.store = store
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, file_path: str) -> str:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending jobs)")
+            self._pending += 1
+        try:
+            job_id = self.store.create(filename, file_path)
+            self._executor.submit(self._run, job_id, file_path)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        logger.info(f"Queued job {job_id} for file: {filename}")
+        return job_id
+
+    def recover(self):
+        """Re-queues jobs that were queued or running when the process stopped."""
+        jobs = self.store.unfinished()
+        for job in jobs:
+            with self._lock:
+                self._pending += 1
+            self.store.update(job["id"], status=QUEUED, stage=QUEUED, progress=0)
+            self._executor.submit(self._run, job["id"], job["file_path"])
+        if jobs:
+            logger.info(f"Recovered {len(jobs)} unfinished jobs")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id: str, file_path: str):
+        try:
+            self.store.update(job_id, status=RUNNING)
+
+            def progress(stage, percent):
+                self.store.update(job_id, stage=stage, progress=percent)
+
+            # API jobs yield Azure quota to the interactive UI
+            with request_priority(BATCH):
+                parsed_data, stats = run_pipeline(file_path, progress=progress)
+            self.store.update(
+                job_id,
+                status=DONE,
+                result=json.dumps({"data": parsed_data, "stats": stats}, ensure_ascii=False)
+            )
+            logger.info(f"Job {job_id} completed")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
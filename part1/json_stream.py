@@ -0,0 +1,128 @@
+# part1/json_stream.py
+
+import json
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LITERAL_CHARS = set("-+.0123456789eEtrufalsn")
+
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON object fed in arbitrary text chunks and reports every
+    scalar field as soon as its value is complete.
+    Text before the first '{' (such as a Markdown code fence) is skipped.
+    """
+
+    def __init__(self):
+        self.result = None
+        self.done = False
+        self._stack = []
+        self._token = None
+        self._escaped = False
+
+    def feed(self, chunk: str) -> list:
+        """
+        Consumes a chunk of text. Returns a list of (path, value) tuples
+        for the fields completed by this chunk, path being a tuple of keys.
+        """
+        events = []
+        for ch in chunk:
+            self._consume(ch, events)
+        return events
+
+    def _consume(self, ch: str, events: list):
+        if self.done:
+            return
+
+        if not self._stack:
+            if ch == "{":
+                self.result = {}
+                self._stack.append({"container": self.result, "path": (), "key": None, "expect_key": True})
+            return
+
+        if self._token is not None and self._token[0] == "string":
+            if self._escaped:
+                self._escaped = False
+                self._token[1].append(ch)
+            elif ch == "\\":
+                self._escaped = True
+                self._token[1].append(ch)
+            elif ch == '"':
+                raw = "".join(self._token[1])
+                self._token = None
+                try:
+                    value = json.loads(f'"{raw}"')
+                except ValueError:
+                    value = raw
+                self._finish_string(value, events)
+            else:
+                self._token[1].append(ch)
+            return
+
+        if self._token is not None:
+            if ch in LITERAL_CHARS:
+                self._token[1].append(ch)
+                return
+            self._finish_literal(events)
+
+        frame = self._stack[-1]
+        if ch.isspace() or ch == ":":
+            if ch == ":":
+                frame["expect_key"] = False
+            return
+        if ch == '"':
+            self._token = ("string", [])
+        elif ch in "{[":
+            container = {} if ch == "{" else []
+            path = self._attach(frame, container)
+            self._stack.append({"container": container, "path": path, "key": None, "expect_key": ch == "{"})
+        elif ch in "}]":
+            self._stack.pop()
+            if not self._stack:
+                self.done = True
+        elif ch == ",":
+            if isinstance(frame["container"], dict):
+                frame["expect_key"] = True
+        elif ch in LITERAL_CHARS:
+            self._token = ("literal", [ch])
+
+    def _attach(self, frame: dict, value) -> tuple:
+        container = frame["container"]
+        if isinstance(container, dict):
+            key = frame["key"]
+            container[key] = value
+        else:
+            key = len(container)
+            container.append(value)
+        return frame["path"] + (key,)
+
+    def _finish_string(self, value: str, events: list):
+        frame = self._stack[-1]
+        if isinstance(frame["container"], dict) and frame["expect_key"]:
+            frame["key"] = value
+            return
+        events.append((self._attach(frame, value), value))
+
+    def _finish_literal(self, events: list):
+        raw = "".join(self._token[1])
+        self._token = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            logger.warning(f"Skipping malformed JSON literal: {raw}")
+            return
+        events.append((self._attach(self._stack[-1], value), value))
+
+
+def parse_partial_json(text: str) -> dict:
+    """
+    Recovers the well-formed fields of a truncated or malformed JSON object.
+    Values cut off by the end of the text are left out.
+    Returns {} when the text contains no object.
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.result or {}
@@ -0,0 +1,248 @@
+# part1/layout_rules.py
+
+import os
+import re
+import logging
+
+from validator import (
+    is_valid_id_number,
+    is_valid_mobile_phone,
+    is_valid_landline_phone,
+    is_valid_postal_code,
+    is_valid_date,
+    is_valid_time,
+)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LAYOUT_MIN_CONFIDENCE = float(os.getenv("LAYOUT_MIN_CONFIDENCE", "0.8"))
+
+# Pages with fewer form labels than this are treated as attachments
+FORM_PAGE_MIN_LABELS = int(os.getenv("FORM_PAGE_MIN_LABELS", "3"))
+
+# Maximum distance (in page units) between a selection mark and the option label it belongs to
+SELECTION_MARK_MAX_DISTANCE = 0.6
+
+# Form labels and the field they fill
+FIELD_LABELS = {
+    "שם משפחה": ("lastName",),
+    "שם פרטי": ("firstName",),
+    "ת.ז": ("idNumber",),
+    "ת.ז.": ("idNumber",),
+    'ת"ז': ("idNumber",),
+    "מספר זהות": ("idNumber",),
+    "מספר תעודת זהות": ("idNumber",),
+    "רחוב": ("address", "street"),
+    "רחוב / תא דואר": ("address", "street"),
+    "מס בית": ("address", "houseNumber"),
+    "מספר בית": ("address", "houseNumber"),
+    "כניסה": ("address", "entrance"),
+    "דירה": ("address", "apartment"),
+    "ישוב": ("address", "city"),
+    "יישוב": ("address", "city"),
+    "מיקוד": ("address", "postalCode"),
+    "תא דואר": ("address", "poBox"),
+    "טלפון קווי": ("landlinePhone",),
+    "טלפון נייד": ("mobilePhone",),
+    "סוג העבודה": ("jobType",),
+    "שעת הפגיעה": ("timeOfInjury",),
+    "תאריך לידה": ("dateOfBirth",),
+    "תאריך הפגיעה": ("dateOfInjury",),
+    "תאריך מילוי הטופס": ("formFillingDate",),
+    "תאריך קבלת הטופס בקופה": ("formReceiptDateAtClinic",),
+}
+
+DATE_FIELDS = {("dateOfBirth",), ("dateOfInjury",), ("formFillingDate",), ("formReceiptDateAtClinic",)}
+
+# Option labels next to selection marks
+SELECTION_OPTIONS = {
+    "זכר": (("gender",), "זכר"),
+    "נקבה": (("gender",), "נקבה"),
+    "כללית": (("medicalInstitutionFields", "healthFundMember"), "כללית"),
+    "מכבי": (("medicalInstitutionFields", "healthFundMember"), "מכבי"),
+    "מאוחדת": (("medicalInstitutionFields", "healthFundMember"), "מאוחדת"),
+    "לאומית": (("medicalInstitutionFields", "healthFundMember"), "לאומית"),
+}
+
+
+def _normalize_label(text: str) -> str:
+    return " ".join(text.replace(":", " ").split())
+
+
+def _digits(text: str) -> str:
+    return re.sub(r"\D", "", text)
+
+
+def parse_date(text: str):
+    """
+    Parses a date written as day/month/year or as eight digits from date boxes.
+    Returns {"day", "month", "year"} or None.
+    """
+    match = re.search(r"(\d{1,2})\s*[./\-]\s*(\d{1,2})\s*[./\-]\s*(\d{4})", text)
+    if match:
+        day, month, year = match.groups()
+    else:
+        digits = _digits(text)
+        if len(digits) != 8:
+            return None
+        day, month, year = digits[:2], digits[2:4], digits[4:]
+    if not is_valid_date(day, month, year):
+        return None
+    return {"day": day.zfill(2), "month": month.zfill(2), "year": year}
+
+
+def parse_value(path: tuple, text: str):
+    """
+    Converts raw text into a field value when it passes the field's format check.
+    Returns None when the value cannot be trusted.
+    """
+    text = text.strip()
+    if not text:
+        return None
+    if path in DATE_FIELDS:
+        return parse_date(text)
+    if path == ("idNumber",):
+        digits = _digits(text)
+        return digits if is_valid_id_number(digits) else None
+    if path == ("mobilePhone",):
+        digits = _digits(text)
+        return digits if is_valid_mobile_phone(digits) else None
+    if path == ("landlinePhone",):
+        digits = _digits(text)
+        return digits if is_valid_landline_phone(digits) else None
+    if path == ("address", "postalCode"):
+        digits = _digits(text)
+        return digits if is_valid_postal_code(digits) else None
+    if path == ("timeOfInjury",):
+        return text if is_valid_time(text) else None
+    return text
+
+
+def _store(fields: dict, path: tuple, value):
+    if path in DATE_FIELDS:
+        for part, part_value in value.items():
+            fields.setdefault(path + (part,), part_value)
+    else:
+        fields.setdefault(path, value)
+
+
+def _on_pages(pair, page_numbers: set) -> bool:
+    regions = pair.key.bounding_regions or []
+    return not regions or any(region.page_number in page_numbers for region in regions)
+
+
+def _from_key_value_pairs(result, pages: list, fields: dict):
+    page_numbers = {page.page_number for page in pages}
+    for pair in result.key_value_pairs or []:
+        if pair.value is None or pair.confidence < LAYOUT_MIN_CONFIDENCE:
+            continue
+        if not _on_pages(pair, page_numbers):
+            continue
+        path = FIELD_LABELS.get(_normalize_label(pair.key.content))
+        if path is None:
+            continue
+        value = parse_value(path, pair.value.content)
+        if value is not None:
+            _store(fields, path, value)
+
+
+def _from_lines(pages: list, fields: dict):
+    """
+    Matches a label line followed by its value on the same or the next line.
+    Only fields with a strict format check are taken from plain lines.
+    """
+    strict = DATE_FIELDS | {("idNumber",), ("mobilePhone",), ("landlinePhone",), ("timeOfInjury",)}
+    for page in pages:
+        lines = [line.content for line in page.lines]
+        for index, line in enumerate(lines):
+            normalized = _normalize_label(line)
+            for label, path in FIELD_LABELS.items():
+                if path not in strict or not normalized.startswith(label):
+                    continue
+                candidates = [normalized[len(label):]]
+                if index + 1 < len(lines):
+                    candidates.append(lines[index + 1])
+                for candidate in candidates:
+                    value = parse_value(path, candidate)
+                    if value is not None:
+                        _store(fields, path, value)
+                        break
+
+
+def _center(polygon):
+    return (
+        sum(point.x for point in polygon) / len(polygon),
+        sum(point.y for point in polygon) / len(polygon),
+    )
+
+
+def _from_selection_marks(pages: list, fields: dict):
+    """
+    Assigns each selected mark to the nearest option label on the same page.
+    """
+    for page in pages:
+        # Distances are in page units: inches for PDFs, pixels for images
+        max_distance = SELECTION_MARK_MAX_DISTANCE * (page.width / 8.5 if page.unit == "pixel" else 1)
+        options = [
+            (_center(line.polygon), SELECTION_OPTIONS[line.content.strip()])
+            for line in page.lines
+            if line.content.strip() in SELECTION_OPTIONS and line.polygon
+        ]
+        for mark in page.selection_marks or []:
+            if mark.state != "selected" or mark.confidence < LAYOUT_MIN_CONFIDENCE or not mark.polygon:
+                continue
+            mark_x, mark_y = _center(mark.polygon)
+            nearest = min(
+                options,
+                key=lambda option: (option[0][0] - mark_x) ** 2 + (option[0][1] - mark_y) ** 2,
+                default=None
+            )
+            if nearest is None:
+                continue
+            (x, y), (path, value) = nearest
+            if ((x - mark_x) ** 2 + (y - mark_y) ** 2) ** 0.5 <= max_distance:
+                fields.setdefault(path, value)
+
+
+def form_page_numbers(result) -> set:
+    """
+    Returns the numbers of the pages that contain the form itself, recognized
+    by the number of form labels on them. Falls back to all pages.
+    """
+    form_pages = set()
+    for page in result.pages:
+        labels = {
+            label
+            for line in page.lines
+            for label in FIELD_LABELS
+            if _normalize_label(line.content).startswith(label)
+        }
+        if len(labels) >= FORM_PAGE_MIN_LABELS:
+            form_pages.add(page.page_number)
+    if not form_pages:
+        return {page.page_number for page in result.pages}
+    if len(form_pages) < len(result.pages):
+        logger.info(f"Form found on pages {sorted(form_pages)} of {len(result.pages)}")
+    return form_pages
+
+
+def extract_layout_fields(result, page_numbers=None) -> dict:
+    """
+    Resolves fields locally from a layout result, optionally only from the given pages.
+    Returns {field path: value} for the fields that could be filled with high confidence.
+    """
+    fields = {}
+    pages = [page for page in result.pages if page_numbers is None or page.page_number in page_numbers]
+    try:
+        _from_key_value_pairs(result, pages, fields)
+        _from_lines(pages, fields)
+        _from_selection_marks(pages, fields)
+    except Exception as e:
+        # The LLM still extracts everything the rules could not
+        logger.warning(f"Layout rule extraction failed: {str(e)}")
+    logger.info(f"Resolved {len(fields)} fields from layout")
+    return fields
@@ -1,12 +1,25 @@
 # part1/main.py
 
 import gradio as gr
-import re
+import os
+import sys
+import uuid
 import json
+from contextlib import asynccontextmanager
 
-from ocr_client import extract_text_from_file
-from gpt_extractor import extract_fields_from_text
-from validator import calculate_extraction_stats
+import aiofiles
+from fastapi import FastAPI, HTTPException, UploadFile, File
+
+# The rate limiter is shared with part2 and lives in the repository root, which
+# entry points put on the import path once for all modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import run_pipeline, stream_pipeline
+from fields import localize, LANGUAGES
+from ocr_client import get_ocr_cache, OCR_CACHE_ENABLED
+from gpt_extractor import get_llm_cache, LLM_CACHE_ENABLED
+from shared.rate_limit import limiter_stats
+from jobs import JobStore, JobQueue, QueueFullError, JOBS_DIR, DONE, FAILED
 
 import logging
 
@@ -21,23 +34,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+UPLOADS_DIR = os.path.join(JOBS_DIR, "uploads")
+os.makedirs(UPLOADS_DIR, exist_ok=True)
 
-def clean_json_string(response: str) -> dict:
-    """
-    Cleans and parses a JSON string possibly wrapped in Markdown code block.
-    """
-    try:
-        # Remove triple backticks and optional language identifier
-        cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", response.strip())
+job_store = JobStore(os.path.join(JOBS_DIR, "jobs.db"))
+job_queue = JobQueue(job_store)
 
-        # Now parse as JSON
-        return json.loads(cleaned)
-    except Exception as e:
-        logger.error(f"Error cleaning JSON string: {str(e)}")
-        raise
+
+# Output language choices shown in the UI
+LANGUAGE_CHOICES = [("English", "en"), ("עברית", "he"), ("Both", "both")]
 
 
-def process_form(file):
+def process_form(file, language="en"):
     """
     Returns cleaned parsed JSON output.
     """
@@ -51,21 +59,22 @@ def process_form(file):
                 "completion_percentage": 0
             }
 
-        logger.info(f"Processing file: {file}")
-        ocr_text = extract_text_from_file(str(file))
-        logger.info("OCR text extraction completed")
-
-        extracted_data = extract_fields_from_text(ocr_text)
-        logger.info("Field extraction completed")
+        return run_pipeline(str(file), language=language)
+    except Exception as e:
+        logger.error(f"Error processing form: {str(e)}")
+        raise gr.Error(f"Failed to process form: {str(e)}")
 
-        parsed_data = clean_json_string(str(extracted_data))
-        logger.info("JSON parsing completed")
 
-        # Calculate extraction statistics
-        stats = calculate_extraction_stats(parsed_data)
-        logger.info(f"Extraction statistics: {stats}")
+def process_form_live(file, stream_fields, language):
+    """
+    Gradio handler that updates the outputs field by field in streaming mode.
+    """
+    if file is None or not stream_fields:
+        yield process_form(file, language)
+        return
 
-        return parsed_data, stats
+    try:
+        yield from stream_pipeline(str(file), language=language)
     except Exception as e:
         logger.error(f"Error processing form: {str(e)}")
         raise gr.Error(f"Failed to process form: {str(e)}")
@@ -75,12 +84,104 @@ with gr.Blocks() as demo:
     gr.Markdown("### 🧾 ביטוח לאומי Form Field Extractor")
     with gr.Row():
         file_input = gr.File(label="Upload PDF or Image")
+    with gr.Row():
+        stream_input = gr.Checkbox(label="Show fields as they are extracted", value=True)
+        language_input = gr.Radio(LANGUAGE_CHOICES, value="en", label="Output keys")
     with gr.Row():
         with gr.Column():
             output_json = gr.JSON(label="Extracted Fields")
         with gr.Column():
             stats_output = gr.JSON(label="Extraction Statistics")
-    file_input.change(process_form, inputs=file_input, outputs=[output_json, stats_output])
+    file_input.change(process_form_live, inputs=[file_input, stream_input, language_input], outputs=[output_json, stats_output])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("Recovering unfinished extraction jobs")
+    job_queue.recover()
+    yield
+    job_queue.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
-demo.launch()
 
+def _remove_upload(file_path):
+    """Removes an upload that was not queued, including a partially written one."""
+    if file_path is not None and os.path.exists(file_path):
+        os.remove(file_path)
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...)):
+    file_path = None
+    try:
+        suffix = os.path.splitext(file.filename or "")[1]
+        file_path = os.path.join(UPLOADS_DIR, f"{uuid.uuid4().hex}{suffix}")
+        async with aiofiles.open(file_path, "wb") as f:
+            while chunk := await file.read(1024 * 1024):
+                await f.write(chunk)
+        job_id = job_queue.submit(file.filename, file_path)
+        return {"job_id": job_id, "status": "queued"}
+    except QueueFullError as e:
+        logger.warning(f"Rejected job submission: {str(e)}")
+        _remove_upload(file_path)
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error submitting job: {str(e)}", exc_info=True)
+        _remove_upload(file_path)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["id"],
+        "filename": job["filename"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, language: str = "en"):
+    """
+    Returns the job result. Results are stored with English keys and
+    converted to the requested language on read, without another LLM call.
+    """
+    if language not in LANGUAGES:
+        raise HTTPException(status_code=422, detail=f"Unsupported output language: {language}")
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # The request is valid, the job is not: a failed job is a conflict, not a server error
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=409, detail=f"Job failed: {job['error']}")
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    result = json.loads(job["result"])
+    result["data"] = localize(result["data"], language)
+    return result
+
+
+@app.get("/stats")
+async def get_stats():
+    return {
+        "ocr_cache": get_ocr_cache().stats() if OCR_CACHE_ENABLED else None,
+        "llm_cache": get_llm_cache().stats() if LLM_CACHE_ENABLED else None,
+        "rate_limits": limiter_stats(),
+    }
+
+
+# Serve the Gradio UI from the same app, so `uvicorn main:app` runs both
+app = gr.mount_gradio_app(app, demo, path="/")
+
+if __name__ == "__main__":
+    demo.launch()
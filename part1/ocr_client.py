@@ -1,9 +1,15 @@
 # part1/ocr_client.py
 
-from azure.ai.formrecognizer import DocumentAnalysisClient
-from azure.core.credentials import AzureKeyCredential
+import io
 import os
+import asyncio
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from shared.rate_limit import get_limiter
+
+from cache import DiskCache, content_key
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -13,40 +19,269 @@ logger = logging.getLogger(__name__)
 
 AZURE_FORM_KEY = os.getenv("AZURE_FORM_KEY")
 AZURE_FORM_ENDPOINT = os.getenv("AZURE_FORM_ENDPOINT")
+LAYOUT_MODEL_ID = "prebuilt-layout"
+# Key-value pairs are an add-on for the layout model, used by the layout rules
+LAYOUT_FEATURES = ["keyValuePairs"]
+
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join("cache", "ocr"))
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "512"))
+
+# Multi-page PDFs are analyzed as concurrent page ranges
+OCR_PAGES_PER_REQUEST = int(os.getenv("OCR_PAGES_PER_REQUEST", "1"))
+OCR_PAGE_CONCURRENCY = int(os.getenv("OCR_PAGE_CONCURRENCY", "4"))
+
+# The Azure SDK is imported and the client built on first use,
+# so importing this module stays cheap and needs no credentials
+_client = None
+_client_lock = threading.Lock()
+
+
+def _check_credentials():
+    if not AZURE_FORM_KEY or not AZURE_FORM_ENDPOINT:
+        logger.error("Missing required environment variables for Azure Form Recognizer")
+        raise ValueError("Missing required environment variables for Azure Form Recognizer")
+
+
+def get_client():
+    """
+    Returns the shared Document Analysis client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _check_credentials()
+                from azure.ai.formrecognizer import DocumentAnalysisClient
+                from azure.core.credentials import AzureKeyCredential
+                try:
+                    _client = DocumentAnalysisClient(
+                        endpoint=AZURE_FORM_ENDPOINT,
+                        credential=AzureKeyCredential(AZURE_FORM_KEY)
+                    )
+                    logger.info("Successfully initialized Document Analysis Client")
+                except Exception as e:
+                    logger.error(f"Failed to initialize Document Analysis Client: {str(e)}")
+                    raise
+    return _client
+
+
+# Created on first use, like the client, so importing this module writes nothing to disk
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """
+    Returns the OCR result cache, creating it on first use, or None when it is disabled.
+    """
+    global _ocr_cache
+    if OCR_CACHE_ENABLED and _ocr_cache is None:
+        with _ocr_cache_lock:
+            if _ocr_cache is None:
+                _ocr_cache = DiskCache(OCR_CACHE_DIR, OCR_CACHE_MAX_MB * 1024 * 1024)
+    return _ocr_cache
+
+
+def count_pdf_pages(document: bytes) -> int:
+    """
+    Returns the number of pages of a PDF, or 0 when the document is not a readable PDF.
+    """
+    if not document.startswith(b"%PDF"):
+        return 0
+    from pypdf import PdfReader
+    try:
+        return len(PdfReader(io.BytesIO(document)).pages)
+    except Exception as e:
+        logger.warning(f"Could not count PDF pages: {str(e)}")
+        return 0
+
+
+def page_ranges(page_count: int, pages_per_request: int = OCR_PAGES_PER_REQUEST) -> list:
+    """
+    Splits pages 1..page_count into (first, last) ranges of at most pages_per_request pages.
+    """
+    return [
+        (first, min(first + pages_per_request - 1, page_count))
+        for first in range(1, page_count + 1, pages_per_request)
+    ]
+
+
+def split_pdf(document: bytes, ranges: list) -> list:
+    """
+    Returns one PDF per (first, last) page range, holding only the pages in that range.
+    """
+    from pypdf import PdfReader, PdfWriter
+    reader = PdfReader(io.BytesIO(document))
+    parts = []
+    for first, last in ranges:
+        writer = PdfWriter()
+        for number in range(first, last + 1):
+            writer.add_page(reader.pages[number - 1])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        parts.append(buffer.getvalue())
+    return parts
+
+
+def _shift_part(value, page_offset: int, content_offset: int):
+    """
+    Moves a result dict to its place in the merged result: adds page_offset to
+    every page_number and content_offset to every span offset.
+    """
+    if isinstance(value, dict):
+        for name, item in value.items():
+            if name == "page_number" and isinstance(item, int):
+                value[name] = item + page_offset
+            elif name in ("span", "spans"):
+                for span in item if isinstance(item, list) else [item]:
+                    if span is not None:
+                        span["offset"] += content_offset
+            else:
+                _shift_part(item, page_offset, content_offset)
+    elif isinstance(value, list):
+        for item in value:
+            _shift_part(item, page_offset, content_offset)
+
+
+def merge_results(results: list, ranges: list):
+    """
+    Merges the results of the split documents into one result in page order,
+    numbering pages as in the original document. Contents are joined with
+    newlines and spans point into the joined content.
+    """
+    merged = None
+    for result, (first, _) in zip(results, ranges):
+        part = result.to_dict()
+        if merged is None:
+            _shift_part(part, first - 1, 0)
+            merged = part
+            continue
+        content = merged.get("content") or ""
+        content_offset = len(content) + 1 if content else 0
+        _shift_part(part, first - 1, content_offset)
+        merged["content"] = "\n".join(filter(None, [content, part.get("content")]))
+        for name in ("pages", "key_value_pairs", "tables", "paragraphs", "styles", "languages"):
+            merged[name] = (merged.get(name) or []) + (part.get(name) or [])
+    merged["pages"].sort(key=lambda page: page["page_number"])
+    from azure.ai.formrecognizer import AnalyzeResult
+    return AnalyzeResult.from_dict(merged)
+
 
-if not AZURE_FORM_KEY or not AZURE_FORM_ENDPOINT:
-    logger.error("Missing required environment variables for Azure Form Recognizer")
-    raise ValueError("Missing required environment variables for Azure Form Recognizer")
+async def _analyze_documents(documents: list) -> list:
+    from azure.ai.formrecognizer.aio import DocumentAnalysisClient as AsyncDocumentAnalysisClient
+    from azure.core.credentials import AzureKeyCredential
 
-try:
-    client = DocumentAnalysisClient(
+    _check_credentials()
+    semaphore = asyncio.Semaphore(OCR_PAGE_CONCURRENCY)
+    async with AsyncDocumentAnalysisClient(
         endpoint=AZURE_FORM_ENDPOINT,
         credential=AzureKeyCredential(AZURE_FORM_KEY)
-    )
-    logger.info("Successfully initialized Document Analysis Client")
-except Exception as e:
-    logger.error(f"Failed to initialize Document Analysis Client: {str(e)}")
-    raise
+    ) as async_client:
 
-def extract_text_from_file(file_path: str) -> str:
+        async def analyze(document: bytes):
+            async with semaphore:
+                poller = await get_limiter("form_recognizer").call_async(
+                    async_client.begin_analyze_document,
+                    LAYOUT_MODEL_ID, document=document, features=LAYOUT_FEATURES
+                )
+                return await poller.result()
+
+        return await asyncio.gather(*(analyze(document) for document in documents))
+
+
+def _run_async(coroutine):
     """
-    Extracting text from uploaded file.
-    Returns raw text.
+    Runs a coroutine to completion from synchronous code. When the caller is
+    itself running an event loop, the coroutine gets its own loop in a worker thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def analyze_document(document: bytes):
+    """
+    Runs the layout model, splitting multi-page PDFs into page ranges
+    that are uploaded and analyzed concurrently.
+    """
+    page_count = count_pdf_pages(document)
+    if page_count <= OCR_PAGES_PER_REQUEST:
+        poller = get_limiter("form_recognizer").call(
+            get_client().begin_analyze_document, LAYOUT_MODEL_ID, document=document, features=LAYOUT_FEATURES
+        )
+        return poller.result()
+
+    ranges = page_ranges(page_count)
+    logger.info(f"Analyzing {page_count} pages in {len(ranges)} concurrent requests")
+    results = _run_async(_analyze_documents(split_pdf(document, ranges)))
+    return merge_results(results, ranges)
+
+
+def analyze_layout(file_path: str):
+    """
+    Runs the layout model on a file, reusing the cached result for identical file bytes.
+    """
+    with open(file_path, "rb") as f:
+        document = f.read()
+
+    key = content_key(LAYOUT_MODEL_ID, ",".join(LAYOUT_FEATURES), document)
+    ocr_cache = get_ocr_cache()
+    if ocr_cache is not None:
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            logger.info(f"OCR cache hit for file: {file_path} ({ocr_cache.stats()})")
+            from azure.ai.formrecognizer import AnalyzeResult
+            return AnalyzeResult.from_dict(cached)
+        logger.info(f"OCR cache miss for file: {file_path}")
+
+    result = analyze_document(document)
+
+    if ocr_cache is not None:
+        ocr_cache.set(key, result.to_dict())
+    return result
+
+
+def layout_pages(result, page_numbers=None) -> list:
+    """
+    Returns the text lines of a layout result grouped by page,
+    optionally only for the given page numbers.
+    """
+    return [
+        [line.content for line in page.lines]
+        for page in result.pages
+        if page_numbers is None or page.page_number in page_numbers
+    ]
+
+
+def extract_pages_from_file(file_path: str) -> list:
+    """
+    Extracting text lines from uploaded file.
+    Returns a list of pages, each a list of line strings.
     """
     try:
         if not file_path or file_path == "None":
             logger.info("No file path provided")
-            return ""
-            
+            return []
+
         logger.info(f"Starting OCR processing for file: {file_path}")
-        with open(file_path, "rb") as f:
-            poller = client.begin_analyze_document("prebuilt-layout", document=f)
-            result = poller.result()
-
-            lines = [line.content for page in result.pages for line in page.lines]
-            text = "\n".join(lines)
-            logger.info(f"Successfully extracted text from file: {file_path}")
-            return text
+        result = analyze_layout(file_path)
+
+        pages = layout_pages(result)
+        logger.info(f"Successfully extracted text from file: {file_path}")
+        return pages
     except Exception as e:
         logger.error(f"Error during OCR processing: {str(e)}")
         raise
+
+
+def extract_text_from_file(file_path: str) -> str:
+    """
+    Extracting text from uploaded file.
+    Returns raw text.
+    """
+    pages = extract_pages_from_file(file_path)
+    return "\n".join(line for page in pages for line in page)
@@ -0,0 +1,248 @@
+# part1/pipeline.py
+
+import os
+import re
+import copy
+import json
+import logging
+
+from ocr_client import analyze_layout, layout_pages
+from compaction import compact_pages
+from layout_rules import extract_layout_fields, form_page_numbers
+from gpt_extractor import extract_fields_from_text, stream_fields_from_text
+from validator import calculate_extraction_stats, validate_fields
+from json_stream import IncrementalJSONParser, parse_partial_json
+from fields import empty_form, set_path, get_path, field_paths, merge_fields, localize, LANGUAGES
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Values that fail validation are often written that way on the form, so asking
+# for them again doubles the LLM calls of such forms; missing fields are always asked for
+REPAIR_INVALID_FIELDS = os.getenv("REPAIR_INVALID_FIELDS", "false").lower() == "true"
+
+# Pipeline stages reported to progress callbacks, with their completion percentage
+STAGES = {
+    "ocr": 10,
+    "extracting": 40,
+    "parsing": 80,
+    "done": 100,
+}
+
+
+def clean_json_string(response: str) -> dict:
+    """
+    Cleans and parses a JSON string possibly wrapped in Markdown code block.
+    """
+    try:
+        # Remove triple backticks and optional language identifier
+        cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", response.strip())
+
+        # Now parse as JSON
+        return json.loads(cleaned)
+    except Exception as e:
+        logger.error(f"Error cleaning JSON string: {str(e)}")
+        raise
+
+
+def parse_model_output(extracted_data) -> dict:
+    """
+    Parses the model output. When it is truncated or malformed, every
+    well-formed field is recovered instead of failing the whole form.
+    """
+    try:
+        parsed_data = clean_json_string(str(extracted_data))
+    except ValueError:
+        parsed_data = parse_partial_json(str(extracted_data))
+        logger.warning(f"Recovered {len(field_paths(parsed_data))} fields from malformed model output")
+    return parsed_data if isinstance(parsed_data, dict) else {}
+
+
+def paths_to_repair(parsed_data: dict, requested_paths: list, include_invalid: bool = REPAIR_INVALID_FIELDS) -> list:
+    """
+    Returns the requested field paths that are missing from the model
+    output and, with include_invalid, those that fail validation.
+    """
+    invalid = validate_fields(parsed_data) if include_invalid else {}
+    return [
+        path for path in requested_paths
+        if isinstance(get_path(parsed_data, path, {}), (dict, list)) or ".".join(path) in invalid
+    ]
+
+
+def repair_fields(parsed_data: dict, ocr_text: str, requested_paths: list) -> int:
+    """
+    Sends one follow-up request for the fields to repair only, reusing the
+    OCR text, and fills in the values that come back valid. A value already
+    read is never replaced by an empty one.
+    Returns the number of fields requested again.
+    """
+    paths = paths_to_repair(parsed_data, requested_paths)
+    if not paths:
+        return 0
+    logger.info(f"Requesting {len(paths)} missing or invalid fields again")
+    repaired = parse_model_output(extract_fields_from_text(ocr_text, paths))
+
+    candidate = copy.deepcopy(parsed_data)
+    updates = []
+    for path in paths:
+        value = get_path(repaired, path, {})
+        if isinstance(value, (dict, list)):
+            continue
+        if value in ("", None) and not isinstance(get_path(parsed_data, path, {}), (dict, list)):
+            continue
+        set_path(candidate, path, value)
+        updates.append((path, value))
+    invalid = validate_fields(candidate)
+    for path, value in updates:
+        if ".".join(path) in invalid:
+            logger.info(f"Discarding invalid repaired value for {'.'.join(path)}")
+            continue
+        set_path(parsed_data, path, value)
+    return len(paths)
+
+
+def extract_ocr_text(file_path: str):
+    """
+    Runs OCR, resolves what it can from the layout and compacts the text
+    before it is sent to the model.
+    Returns (ocr_text, layout_fields, compaction_report).
+    """
+    result = analyze_layout(str(file_path))
+    logger.info("OCR text extraction completed")
+
+    # Attachments are left out of both the layout rules and the prompt
+    page_numbers = form_page_numbers(result)
+    layout_fields = extract_layout_fields(result, page_numbers)
+    ocr_text, compaction = compact_pages(layout_pages(result, page_numbers))
+    return ocr_text, layout_fields, compaction
+
+
+def unresolved_paths(layout_fields: dict):
+    """
+    Returns the field paths left for the model, or None to request the full form.
+    """
+    if not layout_fields:
+        return None
+    return [path for path in field_paths() if path not in layout_fields]
+
+
+def request_fields(ocr_text: str, layout_fields: dict):
+    """
+    Sends only the fields not resolved from the layout to the model.
+    Returns the raw model output.
+    """
+    missing = unresolved_paths(layout_fields)
+    if missing == []:
+        logger.info("All fields resolved from layout, skipping LLM call")
+        return "{}"
+    if missing:
+        logger.info(f"Requesting {len(missing)} unresolved fields from the model")
+    return extract_fields_from_text(ocr_text, missing)
+
+
+def run_pipeline(file_path: str, progress=None, language: str = "en"):
+    """
+    Runs OCR, field extraction and validation for a single file.
+    Calls progress(stage, percent) when entering each stage.
+    Returns (parsed_data, stats), with parsed_data keyed in the requested language
+    and the OCR text compaction report under stats["compaction"].
+    """
+    def report(stage):
+        if progress is not None:
+            progress(stage, STAGES[stage])
+
+    if language not in LANGUAGES:
+        raise ValueError(f"Unsupported output language: {language}")
+
+    logger.info(f"Processing file: {file_path}")
+    report("ocr")
+    ocr_text, layout_fields, compaction = extract_ocr_text(file_path)
+
+    report("extracting")
+    extracted_data = request_fields(ocr_text, layout_fields)
+    logger.info("Field extraction completed")
+
+    report("parsing")
+    parsed_data, stats = parse_extraction(extracted_data, layout_fields, ocr_text)
+    stats["compaction"] = compaction
+
+    report("done")
+    return localize(parsed_data, language), stats
+
+
+def parse_extraction(extracted_data, layout_fields: dict = None, ocr_text: str = None):
+    """
+    Parses the model output, adds the fields resolved from the layout
+    and calculates its statistics. With ocr_text, fields the output is
+    missing or got wrong are requested again.
+    Returns (parsed_data, stats).
+    """
+    parsed_data = parse_model_output(extracted_data)
+    logger.info("JSON parsing completed")
+
+    repaired = 0
+    if ocr_text:
+        requested_paths = unresolved_paths(layout_fields)
+        repaired = repair_fields(parsed_data, ocr_text, field_paths() if requested_paths is None else requested_paths)
+
+    if layout_fields:
+        parsed_data = merge_fields(empty_form(), parsed_data)
+        for path, value in layout_fields.items():
+            set_path(parsed_data, path, value)
+
+    # Calculate extraction statistics
+    stats = calculate_extraction_stats(parsed_data)
+    stats["repaired_fields"] = repaired
+    logger.info(f"Extraction statistics: {stats}")
+    return parsed_data, stats
+
+
+def extract_from_text(ocr_text: str, layout_fields: dict = None):
+    """
+    Runs the GPT extraction stage on OCR text.
+    Returns (parsed_data, stats).
+    """
+    extracted_data = request_fields(ocr_text, layout_fields)
+    logger.info("Field extraction completed")
+    return parse_extraction(extracted_data, layout_fields, ocr_text)
+
+
+def stream_pipeline(file_path: str, language: str = "en"):
+    """
+    Streaming variant of run_pipeline.
+    Yields (partial_data, stats) every time a field is completed by the model,
+    then the final (parsed_data, stats).
+    """
+    if language not in LANGUAGES:
+        raise ValueError(f"Unsupported output language: {language}")
+
+    logger.info(f"Processing file in streaming mode: {file_path}")
+    ocr_text, layout_fields, compaction = extract_ocr_text(file_path)
+
+    partial_data = empty_form()
+    for path, value in layout_fields.items():
+        set_path(partial_data, path, value)
+    if layout_fields:
+        yield localize(partial_data, language), calculate_extraction_stats(partial_data)
+
+    missing = unresolved_paths(layout_fields)
+    deltas = stream_fields_from_text(ocr_text, missing) if missing != [] else iter(["{}"])
+
+    parser = IncrementalJSONParser()
+    parts = []
+    for delta in deltas:
+        parts.append(delta)
+        events = parser.feed(delta)
+        for path, value in events:
+            set_path(partial_data, path, value)
+        if events:
+            yield localize(partial_data, language), calculate_extraction_stats(partial_data)
+    logger.info("Field extraction completed")
+
+    parsed_data, stats = parse_extraction("".join(parts), layout_fields, ocr_text)
+    stats["compaction"] = compaction
+    yield localize(parsed_data, language), stats
@@ -119,4 +119,20 @@ he_form_template = {
         "מהות התאונה": "",
         "אבחנות רפואיות": ""
       }
-    }
\ No newline at end of file
+    }
+
+# Prompt for the fields that could not be resolved from the layout
+
+partial_data_prompt_template = """
+You are a helpful assistant that extracts structured data from OCR output of Israeli National Insurance Institute forms.
+
+Given this OCR text:
+\"\"\"
+{raw_text}
+\"\"\"
+
+Extract only the following fields in JSON format:
+{fields_template}
+
+Leave missing fields as empty strings. Respond ONLY with JSON format.
+"""
@@ -0,0 +1,234 @@
+# part1/stub_servers.py
+
+import io
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+
+from aiohttp import web
+from pypdf import PdfReader
+
+from schema import eng_form_template
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class StubConfig:
+    """
+    Latency and throttling behaviour of the stub servers.
+    Latencies are in seconds.
+    """
+
+    def __init__(self, ocr_latency=1.5, ocr_page_latency=0.5, ocr_poll_interval=0.1,
+                 llm_latency=0.8, llm_token_latency=0.01, throttle_rate=0.0, retry_after=1.0, seed=0):
+        self.ocr_latency = ocr_latency
+        self.ocr_page_latency = ocr_page_latency
+        self.ocr_poll_interval = ocr_poll_interval
+        self.llm_latency = llm_latency
+        self.llm_token_latency = llm_token_latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.counters = {"ocr_requests": 0, "ocr_polls": 0, "llm_requests": 0, "throttled": 0}
+
+
+def _throttled(config: StubConfig):
+    """Returns a 429 response for a configurable share of requests."""
+    if config.random.random() < config.throttle_rate:
+        config.counters["throttled"] += 1
+        return web.json_response(
+            {"error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}},
+            status=429,
+            headers={"Retry-After": str(config.retry_after)}
+        )
+    return None
+
+
+def _polygon(x: float, y: float) -> list:
+    return [x, y, x + 1.5, y, x + 1.5, y + 0.2, x, y + 0.2]
+
+
+def synthetic_page(page_number: int) -> dict:
+    """
+    A layout page with form labels, values and a checked gender box, in the
+    service's REST (camelCase) format.
+    """
+    rows = [
+        "המוסד לביטוח לאומי",
+        "בקשה למתן טיפול רפואי לנפגע עבודה - עצמאי",
+        "שם משפחה", "כהן",
+        "שם פרטי", "ישראל",
+        "ת.ז.", "000000018",
+        "תאריך לידה", "0 1 0 2 1 9 9 0",
+        "טלפון נייד", "050-1234567",
+        "תאריך הפגיעה", "1 5 0 3 2 0 2 4",
+        "שעת הפגיעה", "10:30",
+        "תיאור התאונה", "החלקתי על רצפה רטובה במחסן",
+        f"עמוד {page_number}",
+    ]
+    lines = [
+        {"content": content, "polygon": _polygon(1.0, 0.5 + 0.4 * index), "spans": []}
+        for index, content in enumerate(rows)
+    ]
+    lines.append({"content": "זכר", "polygon": _polygon(5.0, 9.0), "spans": []})
+    lines.append({"content": "נקבה", "polygon": _polygon(7.0, 9.0), "spans": []})
+    return {
+        "pageNumber": page_number,
+        "angle": 0,
+        "width": 8.5,
+        "height": 11,
+        "unit": "inch",
+        "words": [],
+        "lines": lines,
+        "spans": [],
+        "selectionMarks": [
+            {"state": "selected", "polygon": _polygon(5.2, 9.0), "confidence": 0.95, "span": {"offset": 0, "length": 1}}
+        ],
+    }
+
+
+def _requested_pages(pages_param: str, document: bytes) -> list:
+    if pages_param:
+        numbers = []
+        for part in pages_param.split(","):
+            first, _, last = part.strip().partition("-")
+            numbers.extend(range(int(first), int(last or first) + 1))
+        return numbers
+    try:
+        return list(range(1, len(PdfReader(io.BytesIO(document)).pages) + 1))
+    except Exception:
+        return [1]
+
+
+def form_recognizer_app(config: StubConfig) -> web.Application:
+    """
+    Mimics the Form Recognizer analyze long-running operation:
+    POST returns 202 with Operation-Location, GET reports running until the
+    simulated latency has passed, then the analyze result.
+    """
+    operations = {}
+
+    async def analyze(request):
+        throttled = _throttled(config)
+        if throttled is not None:
+            return throttled
+        config.counters["ocr_requests"] += 1
+        model_id = request.match_info["model_id"]
+        pages = _requested_pages(request.query.get("pages", ""), await request.read())
+        result_id = uuid.uuid4().hex
+        ready_at = time.monotonic() + config.ocr_latency + config.ocr_page_latency * len(pages)
+        operations[result_id] = (ready_at, model_id, pages)
+        location = f"{request.url.origin()}/formrecognizer/documentModels/{model_id}/analyzeResults/{result_id}?{request.query_string}"
+        return web.Response(status=202, headers={"Operation-Location": location})
+
+    async def result(request):
+        config.counters["ocr_polls"] += 1
+        ready_at, model_id, pages = operations[request.match_info["result_id"]]
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        poll_headers = {"retry-after-ms": str(int(config.ocr_poll_interval * 1000))}
+        if time.monotonic() < ready_at:
+            return web.json_response(
+                {"status": "running", "createdDateTime": now, "lastUpdatedDateTime": now},
+                headers=poll_headers
+            )
+        del operations[request.match_info["result_id"]]
+        page_results = [synthetic_page(number) for number in pages]
+        return web.json_response({
+            "status": "succeeded",
+            "createdDateTime": now,
+            "lastUpdatedDateTime": now,
+            "analyzeResult": {
+                "apiVersion": request.query.get("api-version", "2023-07-31"),
+                "modelId": model_id,
+                "content": "\n".join(line["content"] for page in page_results for line in page["lines"]),
+                "pages": page_results,
+                "keyValuePairs": [],
+                "tables": [],
+                "paragraphs": [],
+                "styles": [],
+                "languages": [],
+            },
+        })
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/formrecognizer/documentModels/{model_id}:analyze", analyze)
+    app.router.add_get("/formrecognizer/documentModels/{model_id}/analyzeResults/{result_id}", result)
+    return app
+
+
+def _fill_template(template: dict) -> dict:
+    return {
+        key: _fill_template(value) if isinstance(value, dict) else f"stub {key}"
+        for key, value in template.items()
+    }
+
+
+def openai_app(config: StubConfig) -> web.Application:
+    """
+    Mimics the Azure OpenAI chat completions API, including streaming.
+    Completion latency grows with the number of generated tokens.
+    """
+    content = json.dumps(_fill_template(eng_form_template), ensure_ascii=False)
+    # Roughly one token per four characters of output
+    pieces = [content[index:index + 4] for index in range(0, len(content), 4)]
+
+    async def chat_completions(request):
+        throttled = _throttled(config)
+        if throttled is not None:
+            return throttled
+        config.counters["llm_requests"] += 1
+        body = await request.json()
+        deployment = request.match_info["deployment"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        await asyncio.sleep(config.llm_latency)
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.llm_token_latency * len(pieces))
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": deployment,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(pieces), "total_tokens": len(pieces)},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for index, piece in enumerate(pieces + [None]):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": deployment,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": piece} if piece is not None else {},
+                    "finish_reason": None if piece is not None else "stop",
+                }],
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            await asyncio.sleep(config.llm_token_latency)
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/openai/deployments/{deployment}/chat/completions", chat_completions)
+    return app
+
+
+async def start_app(app: web.Application, host: str = "127.0.0.1", port: int = 0) -> tuple:
+    """
+    Starts an app on a local port. Returns (runner, base_url).
+    """
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
@@ -1,40 +1,304 @@
 # part1/validator.py
 
+import re
+import sys
+import json
+from datetime import date
 from typing import Dict, Any
 
-def count_filled_fields(data: Dict[str, Any]) -> int:
-    """
-    Recursively counts all non-empty fields in the JSON structure.
-    """
-    count = 0
-    for value in data.values():
-        if isinstance(value, dict):
-            count += count_filled_fields(value)
-        elif value and str(value).strip():  # Check if value is non-empty
-            count += 1
-    return count
+import numpy as np
+
+from schema import eng_form_template
+from fields import field_paths, english_data
 
 def calculate_extraction_stats(data: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Calculates statistics about the completeness of extracted data.
+    Calculates statistics about the completeness and validity of extracted data.
+    Fields are counted against the output template, including nested ones.
     """
-    # Count total fields (including nested ones)
-    total_fields = 0
-    for value in data.values():
-        if isinstance(value, dict):
-            total_fields += len(value)
-        else:
-            total_fields += 1
+    filled, invalid = compiled_schema.validate_batch([data])
+    total_fields = len(compiled_schema.names)
+    filled_fields = int(filled.sum())
 
-    # Count filled fields
-    filled_fields = count_filled_fields(data)
-    
     # Calculate completion percentage
     completion_percentage = (filled_fields / total_fields * 100) if total_fields > 0 else 0
-    
+
     return {
         "total_fields": total_fields,
         "filled_fields": filled_fields,
         "empty_fields": total_fields - filled_fields,
-        "completion_percentage": round(completion_percentage, 2)
-    } 
\ No newline at end of file
+        "completion_percentage": round(completion_percentage, 2),
+        "invalid_fields": int(invalid.sum()),
+        "validation_errors": compiled_schema.errors(invalid[0]),
+    }
+
+
+def is_valid_id_number(value: str) -> bool:
+    """
+    Validates an Israeli ID number (up to 9 digits) with its check digit.
+    """
+    digits = str(value).strip()
+    if not re.fullmatch(r"\d{1,9}", digits, re.ASCII):
+        return False
+    digits = digits.zfill(9)
+    total = 0
+    for position, digit in enumerate(digits):
+        product = int(digit) * (1 if position % 2 == 0 else 2)
+        total += product - 9 if product > 9 else product
+    return total % 10 == 0
+
+
+def is_valid_mobile_phone(value: str) -> bool:
+    return bool(re.fullmatch(r"05\d{8}", re.sub(r"[\s\-()]", "", str(value)), re.ASCII))
+
+
+def is_valid_landline_phone(value: str) -> bool:
+    return bool(re.fullmatch(r"0(?:[2-489]\d{7}|7\d{8})", re.sub(r"[\s\-()]", "", str(value)), re.ASCII))
+
+
+def is_valid_postal_code(value: str) -> bool:
+    """
+    Israeli postal codes have had 7 digits since 2013.
+    """
+    return bool(re.fullmatch(r"\d{7}", re.sub(r"[\s\-]", "", str(value)), re.ASCII))
+
+
+def is_valid_date(day, month, year, min_year: int = 1900) -> bool:
+    if not all(re.fullmatch(r"\d+", str(part).strip(), re.ASCII) for part in (day, month, year)):
+        return False
+    try:
+        parsed = date(int(year), int(month), int(day))
+    except (TypeError, ValueError):
+        return False
+    return min_year <= parsed.year and parsed <= date.today()
+
+
+def is_valid_time(value: str) -> bool:
+    match = re.fullmatch(r"(\d{1,2}):(\d{2})", str(value).strip(), re.ASCII)
+    return bool(match) and int(match.group(1)) < 24 and int(match.group(2)) < 60
+
+
+# Vectorized per-field checks over columns of string values.
+# Each returns a boolean array that is True where the value is valid.
+# Digits are ASCII only, as in the scalar checks above used by the layout rules.
+
+def _ascii_digits(column: np.ndarray) -> np.ndarray:
+    """True where a value is non-empty and all ASCII digits; np.char.isdigit also accepts other scripts' digits."""
+    return np.char.isdigit(column) & (np.char.str_len(np.char.strip(column, "0123456789")) == 0)
+
+
+def _digits_only(column: np.ndarray) -> np.ndarray:
+    for separator in (" ", "-", "(", ")"):
+        column = np.char.replace(column, separator, "")
+    return column
+
+
+def _valid_id_column(column: np.ndarray) -> np.ndarray:
+    column = np.char.strip(column)
+    is_number = _ascii_digits(column) & (np.char.str_len(column) <= 9)
+    padded = np.char.zfill(np.where(is_number, column, "0"), 9).astype("U9")
+    digits = padded.view(np.uint32).reshape(-1, 9).astype(np.int64) - ord("0")
+    products = digits * np.array([1, 2, 1, 2, 1, 2, 1, 2, 1])
+    products = np.where(products > 9, products - 9, products)
+    return is_number & (products.sum(axis=1) % 10 == 0)
+
+
+def _valid_mobile_column(column: np.ndarray) -> np.ndarray:
+    column = _digits_only(column)
+    return _ascii_digits(column) & (np.char.str_len(column) == 10) & (column.astype("U2") == "05")
+
+
+def _valid_landline_column(column: np.ndarray) -> np.ndarray:
+    column = _digits_only(column)
+    length = np.char.str_len(column)
+    prefix = column.astype("U2")
+    regional = (length == 9) & np.isin(prefix, ["02", "03", "04", "08", "09"])
+    voip = (length == 10) & (prefix == "07")
+    return _ascii_digits(column) & (regional | voip)
+
+
+def _valid_postal_code_column(column: np.ndarray) -> np.ndarray:
+    column = _digits_only(column)
+    return _ascii_digits(column) & (np.char.str_len(column) == 7)
+
+
+def _valid_time_column(column: np.ndarray) -> np.ndarray:
+    parts = np.char.partition(np.char.strip(column), ":")
+    hours, separator, minutes = parts[:, 0], parts[:, 1], parts[:, 2]
+    valid = (separator == ":") & _ascii_digits(hours) & _ascii_digits(minutes)
+    valid &= np.isin(np.char.str_len(hours), [1, 2]) & (np.char.str_len(minutes) == 2)
+    hours = np.where(valid, hours, "0").astype(np.int64)
+    minutes = np.where(valid, minutes, "0").astype(np.int64)
+    return valid & (hours < 24) & (minutes < 60)
+
+
+FIELD_RULES = {
+    "idNumber": (_valid_id_column, "Invalid ID number check digit"),
+    "mobilePhone": (_valid_mobile_column, "Invalid mobile phone number"),
+    "landlinePhone": (_valid_landline_column, "Invalid landline phone number"),
+    "address.postalCode": (_valid_postal_code_column, "Invalid postal code"),
+    "timeOfInjury": (_valid_time_column, "Invalid time, expected HH:MM"),
+}
+
+MIN_YEAR = 1900
+
+# Chronological constraints between date groups: (earlier, later)
+DATE_ORDER = [
+    ("dateOfBirth", "dateOfInjury"),
+    ("dateOfInjury", "formFillingDate"),
+    ("dateOfInjury", "formReceiptDateAtClinic"),
+]
+
+
+def _compile_getter(path: tuple):
+    def getter(record):
+        value = record
+        for key in path:
+            if not isinstance(value, dict):
+                return ""
+            value = value.get(key, "")
+        return "" if value is None or isinstance(value, (dict, list)) else str(value)
+    return getter
+
+
+class CompiledSchema:
+    """
+    Output template compiled once into flat field paths, value getters and
+    per-field checks, so many records are validated column by column.
+    """
+
+    def __init__(self, template: dict):
+        paths = field_paths(template)
+        self.names = [".".join(path) for path in paths]
+        self._getters = [_compile_getter(path) for path in paths]
+        self._index = {name: index for index, name in enumerate(self.names)}
+        self.rules = {
+            self._index[name]: rule for name, rule in FIELD_RULES.items() if name in self._index
+        }
+        self.date_groups = {
+            name: tuple(self._index[f"{name}.{part}"] for part in ("day", "month", "year"))
+            for name in {".".join(path[:-1]) for path in paths if len(path) > 1}
+            if all(f"{name}.{part}" in self._index for part in ("day", "month", "year"))
+        }
+
+    def columns(self, records: list) -> np.ndarray:
+        """
+        Returns the string values of all records as an (records, fields) array.
+        """
+        if not records:
+            return np.empty((0, len(self.names)), dtype=str)
+        return np.array([[getter(record) for getter in self._getters] for record in records], dtype=str)
+
+    def _dates(self, values: np.ndarray, group: tuple):
+        """
+        Returns (dates, valid) for a day/month/year group, dates as datetime64[D].
+        """
+        day, month, year = (np.char.strip(values[:, index]) for index in group)
+        valid = _ascii_digits(day) & _ascii_digits(month) & _ascii_digits(year)
+        # Bounded lengths keep garbled digit strings from overflowing the integer cast
+        valid &= np.isin(np.char.str_len(day), [1, 2]) & np.isin(np.char.str_len(month), [1, 2])
+        valid &= np.char.str_len(year) == 4
+        day, month, year = (np.where(valid, part, "1").astype(np.int64) for part in (day, month, year))
+        valid &= (month >= 1) & (month <= 12) & (day >= 1) & (year >= MIN_YEAR)
+
+        months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype("datetime64[M]")
+        first_day = months.astype("datetime64[D]")
+        days_in_month = ((months + 1).astype("datetime64[D]") - first_day).astype(np.int64)
+        valid &= day <= days_in_month
+
+        dates = first_day + (day - 1)
+        valid &= dates <= np.datetime64(date.today(), "D")
+        return dates, valid
+
+    def validate_batch(self, records: list):
+        """
+        Validates all records in one pass over the columns.
+        Returns (filled, invalid) boolean arrays of shape (records, fields).
+        """
+        values = self.columns(records)
+        filled = np.char.str_len(np.char.strip(values)) > 0
+        invalid = np.zeros_like(filled)
+        if not records:
+            return filled, invalid
+
+        for index, (check, _) in self.rules.items():
+            invalid[:, index] = filled[:, index] & ~check(values[:, index])
+
+        dates = {}
+        for name, group in self.date_groups.items():
+            group_dates, group_valid = self._dates(values, group)
+            group_filled = filled[:, list(group)].any(axis=1)
+            for index in group:
+                invalid[:, index] |= group_filled & ~group_valid
+            dates[name] = (group_dates, group_valid)
+
+        for earlier, later in DATE_ORDER:
+            if earlier not in dates or later not in dates:
+                continue
+            (earlier_dates, earlier_valid), (later_dates, later_valid) = dates[earlier], dates[later]
+            out_of_order = earlier_valid & later_valid & (later_dates < earlier_dates)
+            for index in self.date_groups[later]:
+                invalid[:, index] |= out_of_order
+
+        return filled, invalid
+
+    def errors(self, invalid_row: np.ndarray) -> Dict[str, str]:
+        """
+        Describes the invalid fields of one record.
+        """
+        messages = {}
+        for index in np.flatnonzero(invalid_row):
+            name = self.names[index]
+            if index in self.rules:
+                messages[name] = self.rules[index][1]
+            else:
+                messages[name] = "Invalid or out of range date"
+        return messages
+
+
+compiled_schema = CompiledSchema(eng_form_template)
+
+
+def validate_fields(data: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Validates a single extracted record.
+    Returns {field path: error message} for the invalid fields.
+    """
+    _, invalid = compiled_schema.validate_batch([data])
+    return compiled_schema.errors(invalid[0])
+
+
+def corpus_quality_report(records: list) -> Dict[str, Any]:
+    """
+    Calculates per-field fill and error rates across many extracted records.
+    """
+    filled, invalid = compiled_schema.validate_batch(records)
+    count = len(records)
+    fill_rates = filled.mean(axis=0) if count else np.zeros(len(compiled_schema.names))
+    filled_counts = filled.sum(axis=0)
+    invalid_rates = np.divide(
+        invalid.sum(axis=0), filled_counts,
+        out=np.zeros(len(compiled_schema.names)), where=filled_counts > 0
+    )
+    return {
+        "records": count,
+        "mean_completion_percentage": round(float(fill_rates.mean() * 100), 2) if count else 0,
+        "records_with_errors": int(invalid.any(axis=1).sum()),
+        "fields": {
+            name: {
+                "fill_rate": round(float(fill_rate), 4),
+                "invalid_rate": round(float(invalid_rate), 4),
+            }
+            for name, fill_rate, invalid_rate in zip(compiled_schema.names, fill_rates, invalid_rates)
+        },
+    }
+
+
+if __name__ == "__main__":
+    # Quality report for a JSONL file written by batch.py
+    with open(sys.argv[1], encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    report = corpus_quality_report([
+        english_data(row["data"], row.get("language", "en")) for row in rows if row.get("status") == "ok"
+    ])
+    print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,83 @@
+# part1/worker.py
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+# The rate limiter is shared with part2 and lives in the repository root, which
+# entry points put on the import path once for all modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_import_started = time.perf_counter()
+
+from pipeline import run_pipeline
+from fields import LANGUAGES
+
+# Time spent importing the pipeline, which is most of a worker's cold start
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+COLD_START_BUDGET_MS = float(os.getenv("COLD_START_BUDGET_MS", "500"))
+
+
+def process_file(file_path: str, language: str = "en") -> dict:
+    """
+    Processes one form without the web UI.
+    Returns {"file", "data", "stats"}.
+    """
+    parsed_data, stats = run_pipeline(file_path, language=language)
+    return {"file": file_path, "data": parsed_data, "stats": stats}
+
+
+def check_cold_start(budget_ms: float = COLD_START_BUDGET_MS) -> bool:
+    """
+    Reports the pipeline import time and whether it fits the cold-start budget.
+    No SDK is imported and no client is created until the first form is processed.
+    """
+    import_ms = round(IMPORT_SECONDS * 1000, 1)
+    heavy_modules = [name for name in ("gradio", "openai", "azure.ai.formrecognizer", "tiktoken") if name in sys.modules]
+    print(json.dumps({
+        "import_ms": import_ms,
+        "budget_ms": budget_ms,
+        "eagerly_imported": heavy_modules,
+    }))
+    return import_ms <= budget_ms and not heavy_modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless form extraction worker.")
+    parser.add_argument("files", nargs="*", help="Forms to process; one JSON result per line is written to stdout")
+    parser.add_argument("--language", choices=LANGUAGES, default="en", help="Output keys: English, Hebrew or both")
+    parser.add_argument("--cold-start-check", action="store_true",
+                        help="Only check the import time against COLD_START_BUDGET_MS and exit")
+    args = parser.parse_args(argv)
+
+    if args.cold_start_check:
+        return 0 if check_cold_start() else 1
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    failed = 0
+    for file_path in args.files:
+        try:
+            record = process_file(file_path, args.language)
+        except Exception as e:
+            logger.error(f"Failed to process {file_path}: {str(e)}")
+            record = {"file": file_path, "error": str(e)}
+            failed += 1
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
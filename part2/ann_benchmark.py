@@ -0,0 +1,109 @@
+# part2_chatbot/ann_benchmark.py
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+import numpy as np
+from dotenv import load_dotenv
+
+from embedding_store import EmbeddingStore, EMBEDDINGS_DB
+from vector_index import ChunkIndex, normalize
+from ann_index import IVFPQIndex, default_params
+
+load_dotenv()
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def synthetic_corpus(base: np.ndarray, size: int, rng, noise: float = 0.3) -> np.ndarray:
+    """
+    Scales a corpus up to `size` vectors: clusters around randomly chosen
+    base vectors, so the data keeps the real corpus' directions.
+    """
+    centers = base[rng.integers(len(base), size=size)]
+    return normalize(centers + noise * rng.standard_normal(centers.shape).astype(np.float32) / np.sqrt(base.shape[1]))
+
+
+def recall_at_k(found: np.ndarray, exact: np.ndarray) -> float:
+    hits = sum(len(set(row_found) & set(row_exact)) for row_found, row_exact in zip(found, exact))
+    return hits / exact.size
+
+
+def benchmark_size(corpus: np.ndarray, queries: np.ndarray, ks: list, nprobes: list, rerank: int) -> list:
+    index = ChunkIndex([""] * len(corpus), corpus)
+    k_max = max(ks)
+
+    started = time.perf_counter()
+    exact, _ = index.search_batch(queries, k_max)
+    exact_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+    nlist, m = default_params(*index.matrix.shape)
+    started = time.perf_counter()
+    ann = IVFPQIndex(nlist, m, rerank=rerank).build(index.matrix)
+    build_seconds = time.perf_counter() - started
+
+    rows = []
+    for nprobe in nprobes:
+        started = time.perf_counter()
+        found, _ = ann.search_batch(queries, k_max, nprobe=nprobe)
+        ann_ms = (time.perf_counter() - started) / len(queries) * 1000
+        rows.append({
+            "chunks": len(corpus),
+            "nlist": ann.nlist,
+            "nprobe": nprobe,
+            "build_s": round(build_seconds, 2),
+            "exact_ms": round(exact_ms, 3),
+            "ann_ms": round(ann_ms, 3),
+            **{f"recall@{k}": round(recall_at_k(found[:, :k], exact[:, :k]), 4) for k in ks},
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall and latency of the IVF-PQ index against exact search.")
+    parser.add_argument("--deployment", default=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
+                        help="Embedding deployment whose stored vectors form the base corpus")
+    parser.add_argument("--sizes", default="10000,100000", help="Synthetic corpus sizes")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimension of random vectors when the store is empty")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", default="3,10")
+    parser.add_argument("--nprobe", default="4,8,16,32")
+    parser.add_argument("--rerank", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    ks = [int(k) for k in args.k.split(",")]
+    nprobes = [int(nprobe) for nprobe in args.nprobe.split(",")]
+
+    base = EmbeddingStore(EMBEDDINGS_DB).vectors(args.deployment) if args.deployment else np.empty((0, 0))
+    corpora = []
+    if len(base):
+        print(f"Base corpus: {len(base)} stored embeddings of {args.deployment} ({base.shape[1]} dimensions)")
+        base = normalize(base)
+        # The existing corpus itself, searched exactly and approximately
+        corpora.append(base)
+    else:
+        print(f"No stored embeddings found, using random {args.dim}-dimensional vectors")
+        base = normalize(rng.standard_normal((1000, args.dim)))
+    corpora.extend(synthetic_corpus(base, int(size), rng) for size in args.sizes.split(","))
+
+    rows = []
+    for corpus in corpora:
+        # Queries are held-out points drawn like the corpus itself
+        queries = synthetic_corpus(corpus, args.queries, rng, noise=0.5)
+        rows.extend(benchmark_size(corpus, queries, ks, nprobes, args.rerank))
+
+    columns = list(rows[0])
+    print("".join(f"{column:>12}" for column in columns))
+    for row in rows:
+        print("".join(f"{row[column]:>12}" for column in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
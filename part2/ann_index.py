@@ -0,0 +1,180 @@
+# part2_chatbot/ann_index.py
+
+import os
+import logging
+
+import numpy as np
+
+from vector_index import normalize, top_k
+
+logger = logging.getLogger(__name__)
+
+# Rows scored at once, bounds the memory of the distance matrices
+ASSIGN_BATCH = 8192
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid (squared L2) for every row."""
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), ASSIGN_BATCH):
+        block = data[start:start + ASSIGN_BATCH]
+        assignments[start:start + ASSIGN_BATCH] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return assignments
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means. Empty clusters are re-seeded with random points."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest(data, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        centroids[empty] = data[rng.choice(len(data), int(empty.sum()))]
+    return centroids
+
+
+def default_params(count: int, dim: int) -> tuple:
+    """(nlist, m) for a corpus: about 4 * sqrt(n) lists and 16 dimensions per code."""
+    return max(1, int(4 * count ** 0.5)), max(1, dim // 16)
+
+
+class IVFPQIndex:
+    """
+    Inverted-file index with product-quantized residuals for inner-product
+    search over unit-normalized vectors.
+
+    Vectors are assigned to the nearest of nlist coarse centroids, and their
+    residuals are compressed to m one-byte codes. A query scans only the
+    nprobe closest lists using per-query lookup tables, then re-ranks the
+    best `rerank` candidates with the exact vectors. nprobe and rerank trade
+    recall for latency.
+    """
+
+    def __init__(self, nlist: int, m: int, nprobe: int = 16, rerank: int = 64):
+        self.nlist = nlist
+        self.m = m
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.centroids = None
+        self.codebooks = None
+        self.codes = None
+        self.ids = None
+        self.offsets = None
+        self.vectors = None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """Pads the dimension to a multiple of m and splits it into m sub-vectors."""
+        padding = (-vectors.shape[1]) % self.m
+        if padding:
+            vectors = np.pad(vectors, ((0, 0), (0, padding)))
+        return vectors.reshape(len(vectors), self.m, -1)
+
+    def build(self, vectors: np.ndarray, seed: int = 0):
+        """
+        Trains the coarse centroids and the product quantizer on samples
+        and encodes all vectors. The vectors must be unit-normalized float32
+        rows; they are kept by reference for re-ranking.
+        """
+        rng = np.random.default_rng(seed)
+
+        # About 32 training points per centroid are enough for k-means
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), 32 * self.nlist), replace=False)]
+        self.centroids = kmeans(sample, self.nlist, iterations=10, seed=seed)
+        self.nlist = len(self.centroids)
+
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), 32 * 256), replace=False)]
+        sample_residuals = self._split(sample - self.centroids[_nearest(sample, self.centroids)])
+        self.codebooks = np.stack([
+            kmeans(np.ascontiguousarray(sample_residuals[:, part]), 256, iterations=10, seed=seed + part)
+            for part in range(self.m)
+        ])
+        if self.codebooks.shape[1] < 256:
+            # Tiny corpora have fewer points than codes, repeat centroids to keep the table shape
+            self.codebooks = np.resize(self.codebooks, (self.m, 256, self.codebooks.shape[2]))
+
+        lists = np.empty(len(vectors), dtype=np.int64)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for start in range(0, len(vectors), ASSIGN_BATCH):
+            block = vectors[start:start + ASSIGN_BATCH]
+            block_lists = _nearest(block, self.centroids)
+            residuals = self._split(block - self.centroids[block_lists])
+            lists[start:start + len(block)] = block_lists
+            for part in range(self.m):
+                codes[start:start + len(block), part] = _nearest(residuals[:, part], self.codebooks[part])
+
+        # Store the lists contiguously: rows of list i are offsets[i]:offsets[i + 1]
+        order = np.argsort(lists, kind="stable")
+        self.ids = order
+        self.codes = codes[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=self.nlist))])
+        self.vectors = vectors
+        logger.info(f"Built IVF-PQ index: {len(vectors)} vectors, {self.nlist} lists, {self.m} codes per vector")
+        return self
+
+    def _candidates(self, query: np.ndarray, nprobe: int):
+        """Approximate scores of the vectors in the nprobe lists closest to the query."""
+        coarse = self.centroids @ query
+        probe = np.argpartition(-coarse, min(nprobe, self.nlist) - 1)[:nprobe]
+        tables = np.einsum("md,mkd->mk", self._split(query[None, :])[0], self.codebooks)
+        rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in probe])
+        base = np.repeat(coarse[probe], np.diff(self.offsets)[probe])
+        scores = base + tables[np.arange(self.m), self.codes[rows]].sum(axis=1)
+        return self.ids[rows], scores
+
+    def search_batch(self, queries, k: int, nprobe: int = None):
+        """
+        Returns (indices, scores) arrays of shape (queries, k), best first.
+        Scores of the returned vectors are exact inner products.
+        """
+        nprobe = nprobe or self.nprobe
+        queries = normalize(queries)
+        all_indices = np.full((len(queries), k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for row, query in enumerate(queries):
+            ids, approximate = self._candidates(query, nprobe)
+            if not len(ids):
+                continue
+            shortlist, _ = top_k(approximate[None, :], max(k, self.rerank))
+            ids = ids[shortlist[0]]
+            indices, scores = top_k((self.vectors[ids] @ query)[None, :], k)
+            all_indices[row, :indices.shape[1]] = ids[indices[0]]
+            all_scores[row, :scores.shape[1]] = scores[0]
+        return all_indices, all_scores
+
+    def save(self, path: str, fingerprint: str = ""):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            params=np.array([self.nlist, self.m, self.nprobe, self.rerank]),
+            fingerprint=np.array(fingerprint),
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            codes=self.codes,
+            ids=self.ids,
+            offsets=self.offsets,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, vectors: np.ndarray, fingerprint: str = None):
+        """
+        Loads an index saved with save(). The unit-normalized vectors used for
+        re-ranking are not saved and must be given again.
+        Returns None when the saved index was built for other data.
+        """
+        with np.load(path) as data:
+            if fingerprint is not None and str(data["fingerprint"]) != fingerprint:
+                return None
+            nlist, m, nprobe, rerank = (int(value) for value in data["params"])
+            index = cls(nlist, m, nprobe, rerank)
+            for name in ("centroids", "codebooks", "codes", "ids", "offsets"):
+                setattr(index, name, data[name])
+        index.vectors = vectors
+        return index
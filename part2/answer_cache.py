@@ -0,0 +1,104 @@
+# part2_chatbot/answer_cache.py
+
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from vector_index import normalize
+from member_names import member_name
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity between two questions to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "500"))
+ANSWER_CACHE_TTL_HOURS = float(os.getenv("ANSWER_CACHE_TTL_HOURS", "24"))
+
+
+class SemanticAnswerCache:
+    """
+    Answers per (hmo, tier, knowledge-base version), looked up by the
+    similarity of the question embedding. Entries of older knowledge-base
+    versions are dropped as soon as a new version is seen.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_SIZE,
+                 ttl: float = ANSWER_CACHE_TTL_HOURS * 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, hmo: str, tier: str, version: str) -> dict:
+        """Returns the bucket of a member group. Must be called with the lock held."""
+        if version != self.version:
+            if self._buckets:
+                logger.info("Knowledge base changed, answer cache cleared")
+            self._buckets = {}
+            self.version = version
+        return self._buckets.setdefault(
+            (member_name(hmo), member_name(tier)),
+            {"vectors": np.empty((0, 0), dtype=np.float32), "answers": [], "created": []}
+        )
+
+    def get(self, hmo: str, tier: str, version: str, query_embedding):
+        """Returns the answer of the most similar cached question above the threshold, or None."""
+        now = time.time()
+        query = normalize(query_embedding)[0]
+        with self._lock:
+            bucket = self._bucket(hmo, tier, version)
+            fresh = [index for index, created in enumerate(bucket["created"]) if now - created <= self.ttl]
+            if len(fresh) < len(bucket["created"]):
+                self._keep(bucket, fresh)
+            if bucket["answers"]:
+                scores = bucket["vectors"] @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    logger.info(f"Answer cache hit (similarity {scores[best]:.3f})")
+                    return bucket["answers"][best]
+            self.misses += 1
+            return None
+
+    def set(self, hmo: str, tier: str, version: str, query_embedding, answer: str):
+        vector = normalize(query_embedding)
+        with self._lock:
+            bucket = self._bucket(hmo, tier, version)
+            if bucket["answers"]:
+                bucket["vectors"] = np.vstack([bucket["vectors"], vector])
+            else:
+                bucket["vectors"] = vector
+            bucket["answers"].append(answer)
+            bucket["created"].append(time.time())
+            if len(bucket["answers"]) > self.max_entries:
+                # Oldest entries go first
+                self._keep(bucket, range(len(bucket["answers"]) - self.max_entries, len(bucket["answers"])))
+
+    @staticmethod
+    def _keep(bucket: dict, indices):
+        indices = list(indices)
+        bucket["vectors"] = bucket["vectors"][indices]
+        bucket["answers"] = [bucket["answers"][index] for index in indices]
+        bucket["created"] = [bucket["created"][index] for index in indices]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "entries": sum(len(bucket["answers"]) for bucket in self._buckets.values()),
+                "knowledge_base_version": self.version,
+            }
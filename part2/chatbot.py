@@ -4,10 +4,16 @@ import logging
 import os
 from openai import AsyncAzureOpenAI
 from prompts import collect_info_prompt, qa_prompt_template
-from retrieval import retrieve_relevant_chunks
+from retrieval import (
+    embed_queries, retrieve_passages, lexical_passages, build_context, knowledge_base_version, member_filters,
+    CONTEXT_TOP_K
+)
+from answer_cache import SemanticAnswerCache, ANSWER_CACHE_ENABLED
 from dotenv import load_dotenv
 load_dotenv()
 
+from shared.rate_limit import get_limiter, message_tokens
+
 # Create logs directory if it doesn't exist
 os.makedirs('logs', exist_ok=True)
 
@@ -30,53 +36,130 @@ api_base = os.getenv("AZURE_OPENAI_ENDPOINT")
 api_version = os.getenv("AZURE_OPENAI_API_VERSION")
 DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 
+# Retries are left to the shared rate limiter
 client = AsyncAzureOpenAI(
     api_key=api_key,
     api_version=api_version,
-    azure_endpoint=api_base
+    azure_endpoint=api_base,
+    max_retries=0
 )
 
+# Answers to recent questions, reused for near-identical questions of the same HMO and tier
+answer_cache = SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
+
+COLLECT_INFO_PARAMS = {"temperature": 0.3, "top_p": 0.9, "max_tokens": 256}
+ANSWER_PARAMS = {"temperature": 0.0, "top_p": 1.0, "max_tokens": 1024}
+
+
+async def _completion(chat_messages, stream=False, **params):
+    return await get_limiter("openai").call_async(
+        client.chat.completions.create,
+        model=DEPLOYMENT,
+        messages=chat_messages,
+        stream=stream,
+        tokens=message_tokens(chat_messages, params["max_tokens"]),
+        **params
+    )
+
+
+async def _stream_deltas(stream):
+    """Yields the content deltas of a streamed completion."""
+    async for chunk in stream:
+        # Azure sends content-filter results as chunks without choices
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
 async def collect_user_info(messages):
     try:
         logger.info("Starting user info collection")
-        response = await client.chat.completions.create(
-            model=DEPLOYMENT,
-            messages=[{"role": "system", "content": collect_info_prompt}] + messages,
-            temperature=0.3,
-            top_p=0.9,
-            max_tokens=256,
-        )
+        chat_messages = [{"role": "system", "content": collect_info_prompt}] + messages
+        response = await _completion(chat_messages, **COLLECT_INFO_PARAMS)
         logger.info("Successfully collected user info")
         return response.choices[0].message.content
     except Exception as e:
         logger.error(f"Error in collect_user_info: {str(e)}", exc_info=True)
         raise
 
+async def stream_user_info(messages):
+    """Like collect_user_info, but yields the reply as it is generated."""
+    try:
+        logger.info("Starting streamed user info collection")
+        chat_messages = [{"role": "system", "content": collect_info_prompt}] + messages
+        stream = await _completion(chat_messages, stream=True, **COLLECT_INFO_PARAMS)
+        async for delta in _stream_deltas(stream):
+            yield delta
+        logger.info("Successfully streamed user info")
+    except Exception as e:
+        logger.error(f"Error in stream_user_info: {str(e)}", exc_info=True)
+        raise
+
+async def _prepare_answer(user_info, question):
+    """
+    Returns (cached_answer, chat_messages, query_embedding, version);
+    chat_messages is None when the answer came from the answer cache.
+    Questions answered by the lexical fast path are not embedded, so they
+    have no query_embedding and bypass the answer cache.
+    """
+    query_embedding, version = None, knowledge_base_version()
+    # Only the member's HMO and tier rows of the service tables are searched
+    filters = member_filters(user_info)
+    passages = lexical_passages(question, top_k=CONTEXT_TOP_K, filters=filters)
+    if passages is None:
+        query_embedding = (await embed_queries([question]))[0]
+        if answer_cache is not None:
+            cached = answer_cache.get(user_info["hmo"], user_info["tier"], version, query_embedding)
+            if cached is not None:
+                return cached, None, query_embedding, version
+        passages = retrieve_passages(query_embedding, top_k=CONTEXT_TOP_K, query=question, filters=filters)
+    context = build_context(passages, query=question)
+    logger.debug(f"Answer context:\n{context}")
+
+    prompt = qa_prompt_template.format(
+        context=context,
+        hmo=user_info["hmo"],
+        tier=user_info["tier"],
+        question=question
+    )
+    return None, [{"role": "system", "content": prompt}], query_embedding, version
+
+def _cache_answer(user_info, version, query_embedding, answer):
+    if answer_cache is not None and query_embedding is not None and answer:
+        answer_cache.set(user_info["hmo"], user_info["tier"], version, query_embedding, answer)
+
 async def answer_question(user_info, question):
     try:
         logger.info(f"Processing question for user: {user_info.get('hmo', 'unknown')} - {user_info.get('tier', 'unknown')}")
-        relevant_chunks = await retrieve_relevant_chunks(question, top_k=3)
-        context = "\n\n".join(relevant_chunks)
-
-        print(context)
-
-        prompt = qa_prompt_template.format(
-            context=context,
-            hmo=user_info["hmo"],
-            tier=user_info["tier"],
-            question=question
-        )
-
-        response = await client.chat.completions.create(
-            model=DEPLOYMENT,
-            messages=[{"role": "system", "content": prompt}],
-            temperature=0.0,
-            top_p=1.0,
-            max_tokens=1024,
-        )
+        cached, chat_messages, query_embedding, version = await _prepare_answer(user_info, question)
+        if cached is not None:
+            return cached
+
+        response = await _completion(chat_messages, **ANSWER_PARAMS)
         logger.info("Successfully generated answer")
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        _cache_answer(user_info, version, query_embedding, answer)
+        return answer
     except Exception as e:
         logger.error(f"Error in answer_question: {str(e)}", exc_info=True)
         raise
 
+async def stream_answer(user_info, question):
+    """Like answer_question, but yields the answer as it is generated. Cached answers come in one piece."""
+    try:
+        logger.info(f"Streaming answer for user: {user_info.get('hmo', 'unknown')} - {user_info.get('tier', 'unknown')}")
+        cached, chat_messages, query_embedding, version = await _prepare_answer(user_info, question)
+        if cached is not None:
+            yield cached
+            return
+
+        stream = await _completion(chat_messages, stream=True, **ANSWER_PARAMS)
+        parts = []
+        async for delta in _stream_deltas(stream):
+            parts.append(delta)
+            yield delta
+        logger.info("Successfully streamed answer")
+        # Only complete answers are cached; a client disconnect ends the generator before this
+        _cache_answer(user_info, version, query_embedding, "".join(parts))
+    except Exception as e:
+        logger.error(f"Error in stream_answer: {str(e)}", exc_info=True)
+        raise
@@ -0,0 +1,169 @@
+# part2_chatbot/context_packer.py
+
+import re
+import math
+import logging
+
+from lexical_index import tokenize, prefix_variants
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+TABLE_SEPARATOR_RE = re.compile(r"^[\s|:-]+$")
+# Units with fewer words (headings, short labels) are kept even when repeated
+MIN_DEDUP_WORDS = 3
+# A passage is cut to fit the remaining budget only if at least this many tokens remain
+MIN_PARTIAL_TOKENS = 50
+
+
+def merge_neighbors(passages: list, decode) -> list:
+    """
+    Merges passages whose token spans in the same document overlap or touch
+    into one passage with the best of their scores. Passages are dicts with
+    text, score, tokens (the document's tokens, or None), start and end.
+    Returns the passages best first.
+    """
+    merged = [passage for passage in passages if passage["tokens"] is None]
+    spans = sorted(
+        (passage for passage in passages if passage["tokens"] is not None),
+        key=lambda passage: (id(passage["tokens"]), passage["start"])
+    )
+    current = None
+    for passage in spans:
+        if current is not None and passage["tokens"] is current["tokens"] and passage["start"] <= current["end"]:
+            current["end"] = max(current["end"], passage["end"])
+            current["score"] = max(current["score"], passage["score"])
+            current["merged"] = True
+            continue
+        if current is not None:
+            merged.append(current)
+        current = dict(passage)
+    if current is not None:
+        merged.append(current)
+
+    for passage in merged:
+        if passage.pop("merged", False):
+            passage["text"] = decode(passage["tokens"][passage["start"]:passage["end"]])
+    return sorted(merged, key=lambda passage: passage["score"], reverse=True)
+
+
+def split_units(text: str) -> list:
+    """
+    Splits a passage into (unit, dedupable, line) triples, one per table row
+    or prose sentence. Table headers, separators and headings are not
+    dedupable, so every table keeps its column names.
+    """
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    units = []
+    for number, line in enumerate(lines):
+        if "|" in line:
+            header = number + 1 < len(lines) and TABLE_SEPARATOR_RE.match(lines[number + 1])
+            units.append((line, not header and not TABLE_SEPARATOR_RE.match(line), number))
+        elif line.startswith("#"):
+            units.append((line, False, number))
+        else:
+            units.extend((sentence, True, number) for sentence in SENTENCE_END_RE.split(line) if sentence)
+    return units
+
+
+def join_units(units: list) -> str:
+    """Joins units back into lines; sentences of one line stay on it."""
+    lines = []
+    previous = None
+    for unit, _, line in units:
+        if line == previous:
+            lines[-1] += " " + unit
+        else:
+            lines.append(unit)
+        previous = line
+    return "\n".join(lines)
+
+
+def _unit_key(unit: str) -> str:
+    return " ".join(unit.split()).casefold()
+
+
+def _unit_values(units: list, query: str) -> list:
+    """
+    How many query words each unit contains. Table headers and headings
+    are worth more than any content unit, so a cut passage keeps them.
+    """
+    words = [set(prefix_variants(word)) for word in dict.fromkeys(tokenize(query or ""))]
+    values = []
+    for unit, dedupable, _ in units:
+        if not dedupable:
+            values.append(math.inf)
+            continue
+        variants = {variant for token in tokenize(unit) for variant in prefix_variants(token)}
+        values.append(sum(1 for word in words if word & variants))
+    return values
+
+
+def _fit_units(units: list, available: int, count_tokens, query: str) -> list:
+    """
+    The units of a passage that fit `available` tokens, keeping the ones
+    with the most query words first (earlier ones on ties), in passage order.
+    """
+    values = _unit_values(units, query)
+    kept, tokens = set(), 0
+    for index in sorted(range(len(units)), key=lambda index: (-values[index], index)):
+        unit_tokens = count_tokens(units[index][0]) + 1
+        if tokens + unit_tokens <= available:
+            kept.add(index)
+            tokens += unit_tokens
+    units = [unit for index, unit in enumerate(units) if index in kept]
+    # Headers and headings alone carry no content
+    return units if any(dedupable for _, dedupable, _ in units) else []
+
+
+def pack_context(passages: list, budget: int, count_tokens, query: str = None) -> tuple:
+    """
+    Builds the prompt context from scored passages: packs them by score per
+    token into `budget` tokens, separators included, dropping table rows and
+    sentences already packed from another passage. A passage that does not
+    fit loses the units with the fewest query words. Passages are kept in
+    score order in the context. Returns (context, stats).
+    """
+    separator_tokens = count_tokens("\n\n")
+    candidates = []
+    for rank, passage in enumerate(sorted(passages, key=lambda passage: passage["score"], reverse=True)):
+        units = split_units(passage["text"])
+        if units:
+            tokens = count_tokens(join_units(units))
+            candidates.append({"rank": rank, "density": passage["score"] / max(tokens, 1), "units": units})
+
+    seen = set()
+    chosen = []
+    remaining = budget
+    for candidate in sorted(candidates, key=lambda candidate: candidate["density"], reverse=True):
+        units = []
+        for unit in candidate["units"]:
+            key = _unit_key(unit[0])
+            if unit[1] and len(key.split()) >= MIN_DEDUP_WORDS and key in seen:
+                continue
+            units.append(unit)
+        if not units:
+            continue
+
+        # Every passage after the first is preceded by a separator
+        available = remaining - (separator_tokens if chosen else 0)
+        tokens = count_tokens(join_units(units))
+        if tokens > available:
+            if available < MIN_PARTIAL_TOKENS:
+                continue
+            units = _fit_units(units, available, count_tokens, query)
+            if not units:
+                continue
+            tokens = count_tokens(join_units(units))
+
+        seen.update(_unit_key(unit) for unit, dedupable, _ in units if dedupable)
+        chosen.append((candidate["rank"], join_units(units)))
+        remaining = available - tokens
+
+    context = "\n\n".join(text for _, text in sorted(chosen))
+    stats = {
+        "passages": len(passages),
+        "packed_passages": len(chosen),
+        "context_tokens": count_tokens(context),
+    }
+    return context, stats
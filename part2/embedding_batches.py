@@ -0,0 +1,77 @@
+# part2_chatbot/embedding_batches.py
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def token_batches(token_counts: list, max_items: int, max_tokens: int) -> list:
+    """
+    Splits inputs into consecutive (start, end) ranges of at most max_items
+    inputs and max_tokens tokens. An input larger than max_tokens gets a
+    batch of its own.
+    """
+    batches = []
+    start, tokens = 0, 0
+    for index, count in enumerate(token_counts):
+        if index > start and (index - start >= max_items or tokens + count > max_tokens):
+            batches.append((start, index))
+            start, tokens = index, 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+async def embed_in_batches(texts: list, embed_batch, count_tokens, max_items: int, max_tokens: int,
+                           concurrency: int, on_batch=None) -> list:
+    """
+    Embeds texts in token-bounded batches, at most `concurrency` requests at
+    a time, and returns the embeddings in input order.
+
+    embed_batch(texts, tokens) is awaited per batch and must return one
+    embedding per text; throttled and transient failures are left to its
+    rate limiter. A batch rejected as invalid (HTTP 400, e.g. too many
+    tokens) is split in halves that are retried on their own, so only the
+    offending input fails. on_batch(start, end, embeddings) is called as each
+    batch completes, so finished batches can be stored before others fail.
+    When batches fail, the remaining ones still run and the first error is
+    raised at the end. Token counting and on_batch run in worker threads,
+    off the event loop.
+    """
+    def count_all():
+        return [count_tokens(text) for text in texts]
+
+    token_counts = await asyncio.to_thread(count_all)
+    batches = token_batches(token_counts, max_items, max_tokens)
+    logger.info(f"Embedding {len(texts)} inputs ({sum(token_counts)} tokens) in {len(batches)} batches")
+    embeddings = [None] * len(texts)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def embed_range(start: int, end: int):
+        try:
+            async with semaphore:
+                batch = await embed_batch(texts[start:end], sum(token_counts[start:end]))
+        except Exception as e:
+            if getattr(e, "status_code", None) != 400 or end - start == 1:
+                raise
+            logger.warning(f"Embedding batch of {end - start} inputs rejected ({str(e)}), retrying in halves")
+            middle = (start + end) // 2
+            halves = await asyncio.gather(embed_range(start, middle), embed_range(middle, end), return_exceptions=True)
+            errors = [result for result in halves if isinstance(result, BaseException)]
+            if errors:
+                raise errors[0]
+            return
+        if len(batch) != end - start:
+            raise ValueError(f"Got {len(batch)} embeddings for {end - start} inputs")
+        embeddings[start:end] = batch
+        if on_batch is not None:
+            await asyncio.to_thread(on_batch, start, end, batch)
+
+    results = await asyncio.gather(*(embed_range(start, end) for start, end in batches), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        logger.error(f"{len(errors)} of {len(batches)} embedding batches failed")
+        raise errors[0]
+    return embeddings
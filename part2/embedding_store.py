@@ -0,0 +1,104 @@
+# part2_chatbot/embedding_store.py
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_DB = os.getenv("EMBEDDINGS_DB", os.path.join("cache", "embeddings.db"))
+
+
+def chunk_key(text: str, deployment: str) -> str:
+    """Content hash of a chunk for one embedding deployment."""
+    return hashlib.sha256(f"{deployment}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    SQLite store of chunk embeddings keyed by chunk-content hash and
+    embedding deployment. Vectors are kept as float32 blobs. Stores with
+    different tables can share one file without seeing each other's rows.
+    """
+
+    def __init__(self, path: str = EMBEDDINGS_DB, table: str = "embeddings"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    deployment TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    def get_entries(self, keys: list, max_age: float = None) -> dict:
+        """
+        Returns {key: (created_at, vector)} for the keys that are stored,
+        optionally only entries newer than max_age seconds.
+        """
+        found = {}
+        oldest = time.time() - max_age if max_age is not None else 0
+        with self._lock:
+            # Stay below SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, embedding, created_at FROM {self.table} "
+                    f"WHERE key IN ({','.join('?' * len(batch))}) AND created_at >= ?",
+                    batch + [oldest]
+                ).fetchall()
+                for key, blob, created_at in rows:
+                    found[key] = (created_at, np.frombuffer(blob, dtype=np.float32))
+        return found
+
+    def get_many(self, keys: list, max_age: float = None) -> dict:
+        """Returns {key: vector} for the keys that are stored, optionally only entries newer than max_age seconds."""
+        return {key: vector for key, (_, vector) in self.get_entries(keys, max_age).items()}
+
+    def put_many(self, deployment: str, items: dict):
+        """Stores {key: vector} for a deployment."""
+        now = time.time()
+        rows = [
+            (key, deployment, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)", rows)
+
+    def prune(self, deployment: str, keep: set) -> int:
+        """Deletes the deployment's embeddings of chunks no longer in the knowledge base."""
+        with self._lock, self._conn:
+            stale = [
+                (key,) for (key,) in self._conn.execute(
+                    f"SELECT key FROM {self.table} WHERE deployment = ?", (deployment,)
+                )
+                if key not in keep
+            ]
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale)
+        return len(stale)
+
+    def vectors(self, deployment: str) -> np.ndarray:
+        """Returns all stored embeddings of a deployment as a float32 matrix."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT embedding FROM {self.table} WHERE deployment = ? ORDER BY key", (deployment,)
+            ).fetchall()
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([np.frombuffer(blob, dtype=np.float32) for (blob,) in rows])
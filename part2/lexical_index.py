@@ -0,0 +1,145 @@
+# part2_chatbot/lexical_index.py
+
+import re
+import math
+import logging
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+from vector_index import top_k
+
+logger = logging.getLogger(__name__)
+
+# Cantillation marks and niqqud (not maqaf, which separates words)
+NIQQUD_RE = re.compile(r"[\u0591-\u05bd\u05bf\u05c1\u05c2\u05c4\u05c5\u05c7]")
+TOKEN_RE = re.compile(r"\w+")
+HEBREW_RE = re.compile(r"[\u05d0-\u05ea]")
+# Letters that attach to the next word: ו, ה, ב, כ, ל, מ, ש (e.g. "ולהלבנת" -> "להלבנת" -> "הלבנת")
+HEBREW_PREFIXES = "והבכלמש"
+MAX_PREFIXES = 3
+MIN_STEM = 3
+
+
+def prefix_variants(token: str) -> list:
+    """
+    The word followed by the forms left after stripping up to MAX_PREFIXES
+    leading prefix letters, while at least MIN_STEM letters remain. Hebrew
+    words can start with prefix letters themselves, so all forms are kept.
+    """
+    variants = [token]
+    if HEBREW_RE.match(token):
+        while len(variants) <= MAX_PREFIXES and len(token) - 1 >= MIN_STEM and token[0] in HEBREW_PREFIXES:
+            token = token[1:]
+            variants.append(token)
+    return variants
+
+
+def tokenize(text: str) -> list:
+    """Lower-cased word tokens without niqqud."""
+    text = NIQQUD_RE.sub("", unicodedata.normalize("NFKC", text)).casefold()
+    # Geresh and gershayim inside words, e.g. ת"א, צ'קאפ
+    text = re.sub(r"(?<=\w)[\"'\u05f3\u05f4](?=\w)", "", text)
+    return TOKEN_RE.findall(text)
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over chunk texts; row i belongs to texts[i],
+    as in ChunkIndex. Postings are kept as numpy arrays per term.
+
+    Chunks are indexed under every prefix variant of their words, and a query
+    word matches through its longest indexed variant, so "בזהב" finds "זהב"
+    while "הלבנת" still matches "הלבנת" rather than "לבנת".
+    """
+
+    def __init__(self, texts: list, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.count = len(texts)
+        postings = {}
+        lengths = np.zeros(self.count, dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[row] = len(tokens)
+            frequencies = Counter(variant for token in tokens for variant in prefix_variants(token))
+            for term, frequency in frequencies.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(row)
+                postings[term][1].append(frequency)
+
+        average_length = float(lengths.mean()) if self.count else 0.0
+        # Length normalization of every row, computed once
+        self._norms = k1 * (1 - b + b * lengths / max(average_length, 1.0))
+        self.postings = {}
+        self.idf = {}
+        for term, (rows, frequencies) in postings.items():
+            self.postings[term] = (np.array(rows, dtype=np.int64), np.array(frequencies, dtype=np.float32))
+            self.idf[term] = math.log(1 + (self.count - len(rows) + 0.5) / (len(rows) + 0.5))
+        logger.info(f"Built BM25 index: {self.count} chunks, {len(self.postings)} terms")
+
+    def __len__(self):
+        return self.count
+
+    def query_terms(self, query: str) -> list:
+        """Distinct query terms that occur in the index, each word as its longest indexed variant."""
+        terms = {}
+        for token in tokenize(query):
+            for variant in prefix_variants(token):
+                if variant in self.postings:
+                    terms[variant] = None
+                    break
+        return list(terms)
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in self.query_terms(query):
+            rows, frequencies = self.postings[term]
+            scores[rows] += self.idf[term] * frequencies * (self.k1 + 1) / (frequencies + self._norms[rows])
+        return scores
+
+    def search(self, query: str, k: int, rows=None):
+        """
+        Returns (indices, scores) of the k best-scoring chunks with a positive
+        score, best first, optionally only among the given rows.
+        """
+        if not self.count or (rows is not None and not len(rows)):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.scores(query)
+        if rows is not None:
+            scores = scores[rows]
+        indices, top_scores = top_k(scores[None, :], k)
+        matched = top_scores[0] > 0
+        indices = indices[0][matched]
+        return (rows[indices] if rows is not None else indices), top_scores[0][matched]
+
+    def coverage(self, query: str, row: int) -> tuple:
+        """
+        (matched, share): how many distinct query words one chunk contains, and
+        their share of all distinct query words, including words the index lacks.
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return 0, 0.0
+        matched = 0
+        for word in words:
+            term = next((variant for variant in prefix_variants(word) if variant in self.postings), None)
+            if term is not None and row in self.postings[term][0]:
+                matched += 1
+        return matched, matched / len(words)
+
+
+def reciprocal_rank_fusion(rankings: list, k: int, constant: int = 60) -> tuple:
+    """
+    Merges ranked lists of chunk indices by reciprocal rank fusion:
+    score(d) = sum over lists of 1 / (constant + rank).
+    Returns (indices, scores) of the k best, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, index in enumerate(ranking):
+            if index >= 0:
+                fused[int(index)] = fused.get(int(index), 0.0) + 1.0 / (constant + rank + 1)
+    indices = sorted(fused, key=fused.get, reverse=True)[:k]
+    return indices, [fused[index] for index in indices]
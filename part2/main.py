@@ -1,12 +1,26 @@
 # part2_chatbot/main.py
 import asyncio
+import hmac
+import json
 import logging
 import os
+import sys
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from chatbot import collect_user_info, answer_question
-from retrieval import prepare_doc_embeddings
+
+# The rate limiter is shared with part1 and lives in the repository root, which
+# entry points put on the import path once for all modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot import collect_user_info, answer_question, stream_user_info, stream_answer, answer_cache
+from retrieval import (
+    prepare_doc_embeddings, reload_knowledge_base, watch_knowledge_base, query_cache, retrieval_stats, reload_status,
+    KNOWLEDGE_BASE_WATCH_SECONDS
+)
+from shared.rate_limit import limiter_stats
 
 # Create logs directory if it doesn't exist
 os.makedirs('logs', exist_ok=True)
@@ -32,6 +46,12 @@ root_logger.addHandler(console_handler)
 logger = logging.getLogger(__name__)
 logger.info("Application starting up")
 
+# Token required by the admin endpoints in the X-Admin-Token header; without it they are disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Background tasks are referenced here so they are not garbage-collected while running
+background_tasks = set()
+
 class ChatMessage(BaseModel):
     messages: list
 
@@ -51,7 +71,10 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}", exc_info=True)
         raise
+    watcher = asyncio.create_task(watch_knowledge_base()) if KNOWLEDGE_BASE_WATCH_SECONDS > 0 else None
     yield
+    if watcher is not None:
+        watcher.cancel()
 
 # Initialize FastAPI with lifespan
 app = FastAPI(lifespan=lifespan)
@@ -77,3 +100,77 @@ async def ask_question(req: QARequest):
     except Exception as e:
         logger.error(f"Error in ask_question: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(data: dict, event: str = None) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+async def sse_stream(deltas, name: str):
+    """
+    Forwards completion deltas as `data: {"delta": ...}` events and ends with
+    a `done` event carrying the full text, or an `error` event.
+    """
+    parts = []
+    started = time.perf_counter()
+    try:
+        async for delta in deltas:
+            if not parts:
+                logger.info(f"First {name} token after {(time.perf_counter() - started) * 1000:.0f} ms")
+            parts.append(delta)
+            yield sse_event({"delta": delta})
+        logger.info(f"Successfully streamed {name}")
+        yield sse_event({"text": "".join(parts)}, event="done")
+    except Exception as e:
+        # Headers are already sent, so errors are reported in the stream
+        logger.error(f"Error in {name} stream: {str(e)}", exc_info=True)
+        yield sse_event({"detail": str(e)}, event="error")
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Keep proxies from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/collect_info/stream")
+async def collect_info_stream(msg: ChatMessage):
+    logger.info("Processing streamed collect_info request")
+    return sse_response(sse_stream(stream_user_info(msg.messages), "collect_info"))
+
+@app.post("/ask/stream")
+async def ask_question_stream(req: QARequest):
+    logger.info(f"Processing streamed question: {req.question}")
+    return sse_response(sse_stream(stream_answer(req.user_info, req.question), "ask"))
+
+async def reload_in_background(force: bool):
+    try:
+        await reload_knowledge_base(force=force)
+    except Exception as e:
+        logger.error(f"Error in admin reload: {str(e)}", exc_info=True)
+
+@app.post("/admin/reload", status_code=202)
+async def admin_reload(force: bool = False, x_admin_token: str = Header(None)):
+    """Starts reindexing changed documents in the background; queries keep using the current index."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled, set ADMIN_TOKEN")
+    if not hmac.compare_digest((x_admin_token or "").encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if reload_status["running"]:
+        return {"status": "running", "reload": reload_status}
+    logger.info("Knowledge base reload requested")
+    task = asyncio.create_task(reload_in_background(force))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return {"status": "started", "reload": reload_status}
+
+@app.get("/stats")
+async def get_stats():
+    return {
+        "query_embedding_cache": query_cache.stats(),
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "retrieval": dict(retrieval_stats),
+        "knowledge_base_reload": reload_status,
+        "rate_limits": limiter_stats(),
+    }
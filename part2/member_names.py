@@ -0,0 +1,16 @@
+# part2_chatbot/member_names.py
+
+# HMO and tier spellings accepted by collect_info_prompt, mapped to one name
+MEMBER_NAMES = {
+    "clalit": "כללית",
+    "maccabi": "מכבי",
+    "meuhedet": "מאוחדת",
+    "gold": "זהב",
+    "silver": "כסף",
+    "bronze": "ארד",
+}
+
+
+def member_name(value: str) -> str:
+    value = (value or "").strip().casefold()
+    return MEMBER_NAMES.get(value, value)
@@ -0,0 +1,110 @@
+# part2_chatbot/query_cache.py
+
+import os
+import re
+import asyncio
+import time
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from embedding_store import EmbeddingStore, chunk_key
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2000"))
+QUERY_CACHE_TTL_HOURS = float(os.getenv("QUERY_CACHE_TTL_HOURS", "168"))
+# Optional SQLite file that keeps query embeddings across restarts; its own table
+# keeps them apart from chunk embeddings (and their pruning) when it is EMBEDDINGS_DB
+QUERY_CACHE_DB = os.getenv("QUERY_CACHE_DB")
+QUERY_CACHE_TABLE = "query_embeddings"
+
+
+def normalize_query(query: str) -> str:
+    """Folds case, Unicode forms, whitespace and trailing punctuation of a question."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = " ".join(query.split())
+    return re.sub(r"[\s?!.,;:]+$", "", query)
+
+
+class QueryEmbeddingCache:
+    """
+    In-process LRU cache of query embeddings keyed by normalized query text
+    and embedding deployment, with a TTL and an optional persistent store.
+    Store reads and writes run in worker threads, off the event loop.
+    """
+
+    def __init__(self, deployment: str, max_entries: int = QUERY_CACHE_SIZE,
+                 ttl: float = QUERY_CACHE_TTL_HOURS * 3600, store: EmbeddingStore = None):
+        self.deployment = deployment
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, query: str) -> str:
+        return chunk_key(normalize_query(query), self.deployment)
+
+    async def get(self, query: str):
+        key = self._key(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+
+        stored = None
+        if self.store is not None:
+            stored = (await asyncio.to_thread(self.store.get_entries, [key], self.ttl)).get(key)
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Keeps the stored age, so the entry still expires TTL after it was embedded
+            self._put(key, stored[1], stored[0])
+        return stored[1]
+
+    async def set(self, query: str, vector):
+        key = self._key(query)
+        with self._lock:
+            self._put(key, vector, time.time())
+        if self.store is not None:
+            await asyncio.to_thread(self.store.put_many, self.deployment, {key: vector})
+
+    def _put(self, key: str, vector, created_at: float):
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+            }
+
+
+def create_query_cache(deployment: str) -> QueryEmbeddingCache:
+    store = EmbeddingStore(QUERY_CACHE_DB, table=QUERY_CACHE_TABLE) if QUERY_CACHE_DB else None
+    return QueryEmbeddingCache(deployment, store=store)
@@ -1,17 +1,31 @@
 
 import os
+import re
+import time
+import asyncio
+import hashlib
 import logging
+from collections import Counter
 import aiofiles
 from bs4 import BeautifulSoup
 from openai import AsyncAzureOpenAI
 import tiktoken
-import numpy as np
-from scipy.spatial.distance import cosine
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+from shared.rate_limit import get_limiter, request_priority, BACKGROUND
+
+from embedding_store import EmbeddingStore, chunk_key
+from vector_index import ChunkIndex
+from ann_index import IVFPQIndex, default_params
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from context_packer import merge_neighbors, pack_context
+from embedding_batches import embed_in_batches
+from query_cache import create_query_cache
+from member_names import member_name, MEMBER_NAMES
+
 # Logging setup
 os.makedirs('logs', exist_ok=True)
 logging.basicConfig(
@@ -25,6 +39,42 @@ logger = logging.getLogger(__name__)
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# Embedding requests: at most EMBED_BATCH_SIZE inputs and EMBED_BATCH_TOKENS tokens each,
+# EMBED_CONCURRENCY in flight. Azure accepts up to 2048 inputs per request (16 for older ada-002 deployments).
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "50000"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+
+# Knowledge base directory, polled for changed documents every KNOWLEDGE_BASE_WATCH_SECONDS (0 disables)
+KNOWLEDGE_BASE_DIR = os.getenv("KNOWLEDGE_BASE_DIR", "data")
+KNOWLEDGE_BASE_WATCH_SECONDS = float(os.getenv("KNOWLEDGE_BASE_WATCH_SECONDS", "5"))
+
+# Search backend: "exact" scans all chunks, "ivfpq" uses an approximate index
+# once the knowledge base has ANN_MIN_CHUNKS chunks. ANN_NPROBE trades recall for latency.
+RETRIEVAL_INDEX = os.getenv("RETRIEVAL_INDEX", "exact")
+ANN_MIN_CHUNKS = int(os.getenv("ANN_MIN_CHUNKS", "20000"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+ANN_RERANK = int(os.getenv("ANN_RERANK", "64"))
+ANN_INDEX_PATH = os.getenv("ANN_INDEX_PATH", os.path.join("cache", "ann_index.npz"))
+
+# Hybrid search fuses the FUSION_CANDIDATES best chunks of BM25 and vector search.
+# The lexical fast path answers from BM25 alone, without embedding the query, when the
+# best chunk contains LEXICAL_FAST_COVERAGE of the query's words, at least LEXICAL_FAST_MIN_TERMS
+# of them, scores at least LEXICAL_FAST_MIN_SCORE and outscores a matching runner-up by LEXICAL_FAST_MARGIN.
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+FUSION_CANDIDATES = int(os.getenv("FUSION_CANDIDATES", "20"))
+LEXICAL_FAST_PATH = os.getenv("LEXICAL_FAST_PATH", "true").lower() == "true"
+LEXICAL_FAST_COVERAGE = float(os.getenv("LEXICAL_FAST_COVERAGE", "1.0"))
+LEXICAL_FAST_MARGIN = float(os.getenv("LEXICAL_FAST_MARGIN", "1.5"))
+LEXICAL_FAST_MIN_TERMS = int(os.getenv("LEXICAL_FAST_MIN_TERMS", "2"))
+LEXICAL_FAST_MIN_SCORE = float(os.getenv("LEXICAL_FAST_MIN_SCORE", "5.0"))
+
+# Answers are built from the CONTEXT_TOP_K best chunks, packed into CONTEXT_TOKEN_BUDGET tokens
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "5"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Context tokens saved are measured against the former context: the 3 best chunks joined as they are
+BASELINE_CONTEXT_TOP_K = 3
+
 # Azure OpenAI config
 api_key = os.getenv("AZURE_OPENAI_KEY")
 api_base = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -32,47 +82,88 @@ api_version = os.getenv("AZURE_OPENAI_API_VERSION")
 DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 
-# OpenAI client
+# OpenAI client, retries are left to the shared rate limiter
 client = AsyncAzureOpenAI(
     api_key=api_key,
     api_version=api_version,
-    azure_endpoint=api_base
+    azure_endpoint=api_base,
+    max_retries=0
 )
 
 # Tokenizer
 tokenizer = tiktoken.encoding_for_model(AZURE_OPENAI_EMBEDDING_DEPLOYMENT)
 
-# Global state
-doc_chunks = []
-doc_embeddings = None
+# Embeddings persisted across restarts, so only new or changed chunks are embedded
+embedding_store = EmbeddingStore()
+
+# Embeddings of recent questions, so repeated questions skip the embedding call
+query_cache = create_query_cache(AZURE_OPENAI_EMBEDDING_DEPLOYMENT)
+
+# Tier labels inside table cells, e.g. "זהב: 70% הנחה"
+TIER_RE = re.compile(r"({})\s*:".format("|".join(member_name(tier) for tier in ("gold", "silver", "bronze"))))
+
+# Global state: chunk texts with their normalized embedding matrix and BM25 index
+doc_index = ChunkIndex([], [])
 
-# HTML to structured plain text
+# Processed documents by file name: stat signature, content hash, tokens, chunks and table records.
+# Only reloads replace it, under _reload_lock.
+_documents = {}
+_reload_lock = asyncio.Lock()
+reload_status = {"running": False, "last_reload": None, "seconds": None, "changed": [], "removed": [], "error": None}
+
+# How queries were answered (lexical fast path, hybrid or vector-only search)
+# and prompt tokens saved by context packing
+retrieval_stats = Counter()
+
+def _tier_details(cell_text: str) -> dict:
+    """Splits a cell like "זהב: 70% הנחה כסף: 50% הנחה ..." into {tier: details}; {None: text} without tiers."""
+    parts = TIER_RE.split(cell_text)
+    if len(parts) == 1:
+        return {None: cell_text}
+    details = {}
+    if parts[0].strip():
+        details[None] = parts[0].strip()
+    for tier, text in zip(parts[1::2], parts[2::2]):
+        details[member_name(tier)] = text.strip()
+    return details
+
+
+# HTML to structured plain text and per-row table records
 def extract_structured_text(html):
+    """
+    Returns (text, records). Tables become records, one per service, HMO
+    column and tier, each a dict with the record text and its facets
+    (category, service, hmo, tier). The text holds the rest of the page.
+    """
     soup = BeautifulSoup(html, "html.parser")
     parts = []
+    records = []
 
     def clean_text(text):
         return ' '.join(text.strip().split())
 
-    # Convert tables to markdown-like format
+    # Split tables into records: the first column names the service, the other columns are HMOs
     for table in soup.find_all("table"):
+        heading = table.find_previous(["h1", "h2", "h3"])
+        category = clean_text(heading.get_text()) if heading else ""
         headers = [clean_text(th.get_text()) for th in table.find_all("th")]
-        rows = []
         for tr in table.find_all("tr"):
-            row = [clean_text(td.get_text()) for td in tr.find_all("td")]
-            if row:
-                rows.append(row)
-
-        if headers:
-            parts.append(" | ".join(headers))
-            parts.append(" | ".join(["---"] * len(headers)))
-        for row in rows:
-            parts.append(" | ".join(row))
-        parts.append("\n")  # Separate tables from other content
+            row = [clean_text(td.get_text(" ")) for td in tr.find_all("td")]
+            if not row:
+                continue
+            service = row[0]
+            for column, cell in zip(headers[1:], row[1:]):
+                hmo = member_name(column)
+                for tier, details in _tier_details(cell).items():
+                    label = f"{column} {tier}" if tier else column
+                    records.append({
+                        "text": f"{category} | {service} | {label}: {details}",
+                        "facets": {"category": category, "service": service, "hmo": hmo, "tier": tier},
+                    })
 
     # Convert rest of the HTML (excluding tables) into readable format
     for el in soup.find_all(["h1", "h2", "h3", "p", "ul", "ol", "li", "pre", "code"]):
-        if el.name in ["table", "tr", "td", "th"]:
+        if el.find_parent("table"):
             continue  # Already handled
         elif el.name.startswith("h"):
             level = int(el.name[1])
@@ -85,61 +176,49 @@ def extract_structured_text(html):
         else:
             parts.append(clean_text(el.get_text()))
 
-    return "\n\n".join(part for part in parts if part.strip())
+    return "\n\n".join(part for part in parts if part.strip()), records
 
 
 
-async def load_html_docs(directory="data"):
-    """Load HTML files and extract all readable documentation text."""
-    try:
-        logger.info(f"Loading HTML documents from {directory}")
-        docs = []
-        for filename in os.listdir(directory):
-            if filename.endswith(".html"):
-                path = os.path.join(directory, filename)
-                async with aiofiles.open(path, encoding="utf-8") as f:
-                    content = await f.read()
-                    structured_text = extract_structured_text(content)
-                    docs.append(structured_text)
-                    logger.info(f"Processed {filename}")
-        logger.info(f"Total documents loaded: {len(docs)}")
-        return docs
-    except Exception as e:
-        logger.error(f"Error in load_html_docs: {e}", exc_info=True)
-        raise
+def chunk_spans(length: int) -> list:
+    """(start, end) token offsets of overlapping chunks of a document with `length` tokens."""
+    spans = []
+    start = 0
+    while start < length:
+        end = min(start + CHUNK_SIZE, length)
+        spans.append((start, end))
+        if end == length:
+            break
+        start += CHUNK_SIZE - CHUNK_OVERLAP
+    return spans
 
 
-def chunk_text(text):
-    """Token-based overlapping chunking."""
-    try:
-        tokens = tokenizer.encode(text)
-        chunks = []
-        start = 0
-        while start < len(tokens):
-            end = min(start + CHUNK_SIZE, len(tokens))
-            chunk = tokenizer.decode(tokens[start:end])
-            chunks.append(chunk)
-            if end == len(tokens):
-                break
-            start += CHUNK_SIZE - CHUNK_OVERLAP
-        logger.info(f"Chunked into {len(chunks)} chunks")
-        return chunks
-    except Exception as e:
-        logger.error(f"Error in chunk_text: {e}", exc_info=True)
-        raise
-
+async def _embed_batch(texts: list[str], tokens: int):
+    response = await get_limiter("embeddings").call_async(
+        client.embeddings.create,
+        input=texts,
+        model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+        tokens=tokens
+    )
+    return [e.embedding for e in response.data]
 
-def cosine_similarity(a, b):
-    return 1 - cosine(a, b)
 
-async def embed_texts(texts: list[str]):
+async def embed_texts(texts: list[str], on_batch=None):
+    """
+    Embeds texts in token-bounded batches with bounded concurrency, in input order.
+    on_batch(start, end, embeddings) is called as each batch completes.
+    """
     try:
         logger.info(f"Embedding {len(texts)} chunks")
-        response = await client.embeddings.create(
-            input=texts,
-            model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+        embeddings = await embed_in_batches(
+            texts,
+            _embed_batch,
+            lambda text: len(tokenizer.encode(text)),
+            max_items=EMBED_BATCH_SIZE,
+            max_tokens=EMBED_BATCH_TOKENS,
+            concurrency=EMBED_CONCURRENCY,
+            on_batch=on_batch,
         )
-        embeddings = [e.embedding for e in response.data]
         logger.info("Embedding complete")
         return embeddings
     except Exception as e:
@@ -147,35 +226,350 @@ async def embed_texts(texts: list[str]):
         raise
 
 
+async def embed_queries(queries: list[str]):
+    """Returns the embeddings of user queries, embedding only those not in the query cache."""
+    embeddings = [await query_cache.get(query) for query in queries]
+    missing = [index for index, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        for index, embedding in zip(missing, await embed_texts([queries[index] for index in missing])):
+            await query_cache.set(queries[index], embedding)
+            embeddings[index] = embedding
+    else:
+        logger.info("Query embeddings served from cache")
+    return embeddings
+
+
+def _stored_embeddings(chunks: list[str]):
+    """Returns (keys, stored): the store keys of the chunks and their embeddings found in the store."""
+    keys = [chunk_key(chunk, AZURE_OPENAI_EMBEDDING_DEPLOYMENT) for chunk in chunks]
+    return keys, embedding_store.get_many(keys)
+
+
+async def embed_chunks(chunks: list[str]):
+    """
+    Returns the embeddings of the chunks, taking stored ones from the
+    embedding store and embedding only new or changed chunks.
+    """
+    # Hashing and SQLite lookups of a whole knowledge base would block the event loop
+    keys, stored = await asyncio.to_thread(_stored_embeddings, chunks)
+    missing = {key: chunk for key, chunk in zip(keys, chunks) if key not in stored}
+    logger.info(f"{len(stored)} chunk embeddings loaded from store, {len(missing)} to embed")
+
+    if missing:
+        missing_keys = list(missing)
+
+        def store_batch(start, end, embeddings):
+            # Stored per batch, so a failed run resumes with the batches still missing
+            new = dict(zip(missing_keys[start:end], embeddings))
+            embedding_store.put_many(AZURE_OPENAI_EMBEDDING_DEPLOYMENT, new)
+            stored.update(new)
+
+        # Index building yields embedding quota to user queries
+        with request_priority(BACKGROUND):
+            await embed_texts(list(missing.values()), on_batch=store_batch)
+
+    pruned = await asyncio.to_thread(embedding_store.prune, AZURE_OPENAI_EMBEDDING_DEPLOYMENT, set(keys))
+    if pruned:
+        logger.info(f"Removed {pruned} embeddings of chunks no longer in the knowledge base")
+    return [stored[key] for key in keys]
+
+
+def build_index(chunks: list[str], embeddings, sources: list = None, documents: list = None,
+                facets: list = None) -> ChunkIndex:
+    """
+    Builds the chunk index with its BM25 index, and an IVF-PQ index when configured.
+    sources and documents locate every chunk in its document's tokens,
+    facets hold the metadata chunks can be filtered by.
+    The index version is a hash of all chunk keys.
+    A saved IVF-PQ index is reused when it was built for the same chunks.
+    """
+    fingerprint = index_version(chunks)
+    index = ChunkIndex(chunks, embeddings, version=fingerprint)
+    index.sources, index.documents, index.facets = sources, documents, facets
+    if HYBRID_RETRIEVAL or LEXICAL_FAST_PATH:
+        index.lexical = BM25Index(chunks)
+    if RETRIEVAL_INDEX != "ivfpq" or len(index) < ANN_MIN_CHUNKS:
+        return index
+
+    ann = None
+    if os.path.exists(ANN_INDEX_PATH):
+        ann = IVFPQIndex.load(ANN_INDEX_PATH, index.matrix, fingerprint)
+    if ann is None:
+        nlist, m = default_params(*index.matrix.shape)
+        ann = IVFPQIndex(nlist, m).build(index.matrix)
+        ann.save(ANN_INDEX_PATH, fingerprint)
+    else:
+        logger.info(f"Loaded IVF-PQ index from {ANN_INDEX_PATH}")
+    ann.nprobe, ann.rerank = ANN_NPROBE, ANN_RERANK
+    index.ann = ann
+    return index
+
+
+def index_version(chunks: list[str]) -> str:
+    """Hash of all chunk keys; identifies the chunk set for caches built on top of the index."""
+    return hashlib.sha256(
+        "".join(chunk_key(chunk, AZURE_OPENAI_EMBEDDING_DEPLOYMENT) for chunk in chunks).encode("utf-8")
+    ).hexdigest()
+
+
+def _scan_documents(directory: str) -> dict:
+    """(mtime, size) of every HTML file in the directory, by file name."""
+    signatures = {}
+    for filename in os.listdir(directory):
+        if filename.endswith(".html"):
+            stat = os.stat(os.path.join(directory, filename))
+            signatures[filename] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+
+def _process_document(content: str) -> dict:
+    """Extracts, tokenizes and chunks one HTML document."""
+    text, records = extract_structured_text(content)
+    tokens = tokenizer.encode(text)
+    spans = chunk_spans(len(tokens))
+    return {
+        "tokens": tokens,
+        "spans": spans,
+        "chunks": [tokenizer.decode(tokens[start:end]) for start, end in spans],
+        "records": records,
+    }
+
+
+async def reload_knowledge_base(directory: str = None, force: bool = False) -> bool:
+    """
+    Re-processes the documents added or changed since the last load, embeds
+    only new chunks and builds a new index off to the side. The new index
+    replaces doc_index in one assignment, so queries always see a complete
+    index and are served from the old one meanwhile. Returns True when the
+    index was replaced.
+    """
+    global doc_index, _documents
+    directory = directory or KNOWLEDGE_BASE_DIR
+    async with _reload_lock:
+        signatures = _scan_documents(directory)
+        changed = [name for name in signatures if name not in _documents or _documents[name]["signature"] != signatures[name]]
+        removed = [name for name in _documents if name not in signatures]
+        if not changed and not removed and not force:
+            return False
+
+        started = time.monotonic()
+        reload_status.update(running=True, error=None)
+        try:
+            documents = {name: _documents[name] for name in signatures if name not in changed}
+            for name in changed:
+                async with aiofiles.open(os.path.join(directory, name), encoding="utf-8") as f:
+                    content = await f.read()
+                content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+                previous = _documents.get(name)
+                if previous is not None and previous["hash"] == content_hash:
+                    # Touched but not edited
+                    documents[name] = dict(previous, signature=signatures[name])
+                    continue
+                processed = await asyncio.to_thread(_process_document, content)
+                documents[name] = dict(processed, signature=signatures[name], hash=content_hash)
+                logger.info(f"Processed {name}: {len(processed['chunks'])} chunks, {len(processed['records'])} table records")
+
+            all_chunks, sources, tokens, facets = [], [], [], []
+            for doc_id, name in enumerate(sorted(documents)):
+                document = documents[name]
+                tokens.append(document["tokens"])
+                for (start, end), chunk in zip(document["spans"], document["chunks"]):
+                    all_chunks.append(chunk)
+                    sources.append((doc_id, start, end))
+                    facets.append({})
+                # Table records are chunks of their own, found by their facets
+                for record in document["records"]:
+                    all_chunks.append(record["text"])
+                    sources.append(None)
+                    facets.append(record["facets"])
+
+            replaced = force or index_version(all_chunks) != doc_index.version
+            if replaced:
+                logger.info(f"Indexing {len(documents)} documents: {len(all_chunks)} chunks and table records")
+                embeddings = await embed_chunks(all_chunks)
+                index = await asyncio.to_thread(build_index, all_chunks, embeddings, sources, tokens, facets)
+                doc_index = index
+                logger.info(f"Knowledge base index replaced: {len(index)} chunks, version {index.version[:12]}")
+            _documents = documents
+            reload_status.update(
+                last_reload=time.time(), seconds=round(time.monotonic() - started, 3),
+                changed=sorted(changed), removed=sorted(removed)
+            )
+            return replaced
+        except Exception as e:
+            reload_status["error"] = str(e)
+            raise
+        finally:
+            reload_status["running"] = False
+
+
+async def watch_knowledge_base(interval: float = KNOWLEDGE_BASE_WATCH_SECONDS):
+    """Polls the knowledge base directory and reloads changed documents until cancelled."""
+    logger.info(f"Watching {KNOWLEDGE_BASE_DIR} for changes every {interval} seconds")
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reload_knowledge_base()
+        except Exception as e:
+            # The current index keeps serving until a reload succeeds
+            logger.error(f"Knowledge base reload failed: {e}", exc_info=True)
+
+
 async def prepare_doc_embeddings():
     """Load, chunk, embed and store all docs for retrieval."""
-    global doc_chunks
     try:
         logger.info("Preparing document embeddings")
-        docs = await load_html_docs()
-        all_chunks = []
-        for doc in docs:
-            all_chunks.extend(chunk_text(doc))
-        embeddings = await embed_texts(all_chunks)
-        doc_chunks = list(zip(all_chunks, embeddings))
-        logger.info(f"Prepared {len(doc_chunks)} embedded chunks")
+        await reload_knowledge_base(force=True)
+        logger.info(f"Prepared {len(doc_index)} embedded chunks")
     except Exception as e:
         logger.error(f"Error in prepare_doc_embeddings: {e}", exc_info=True)
         raise
 
 
-async def retrieve_relevant_chunks(query: str, top_k=3):
+def knowledge_base_version() -> str:
+    return doc_index.version
+
+
+def _passages(index: ChunkIndex, indices, scores) -> list:
+    """Retrieved chunks as passages for context packing, see context_packer."""
+    passages = []
+    for i, score in zip(indices, scores):
+        if i < 0:
+            continue
+        passage = {"text": index.texts[i], "score": float(score), "tokens": None, "start": 0, "end": 0}
+        if index.sources is not None and index.sources[i] is not None:
+            doc_id, passage["start"], passage["end"] = index.sources[i]
+            passage["tokens"] = index.documents[doc_id]
+        passages.append(passage)
+    return passages
+
+
+def _known_member_name(value):
+    """The normalized HMO or tier name, or None for values not in MEMBER_NAMES."""
+    name = member_name(value)
+    return name if name in MEMBER_NAMES.values() else None
+
+
+def member_filters(user_info: dict) -> dict:
+    """Facet filters for the HMO and tier of a member; unknown values are not filtered."""
+    filters = {}
+    for facet in ("hmo", "tier"):
+        value = user_info.get(facet)
+        filters[facet] = _known_member_name(value)
+        if value and filters[facet] is None:
+            logger.warning(f"Unknown {facet} {value!r}, searching the rows of all {facet} values")
+    return filters
+
+
+def lexical_passages(query: str, top_k=3, filters: dict = None):
+    """
+    Returns the top_k passages by BM25 alone when the best chunk is an
+    unambiguous exact match for the query, otherwise None.
+    With filters, only chunks whose facets match are searched.
+    """
+    index = doc_index
+    if not LEXICAL_FAST_PATH or index.lexical is None:
+        return None
+    indices, scores = index.lexical.search(query, max(top_k, 2), rows=index.rows_matching(filters))
+    # A single matching chunk is weak evidence, not a clear margin
+    if len(indices) < 2 or scores[0] < LEXICAL_FAST_MIN_SCORE or scores[0] < LEXICAL_FAST_MARGIN * scores[1]:
+        return None
+    matched, coverage = index.lexical.coverage(query, indices[0])
+    if matched < LEXICAL_FAST_MIN_TERMS or coverage < LEXICAL_FAST_COVERAGE:
+        return None
+    retrieval_stats["lexical_fast_path"] += 1
+    logger.info(f"Lexical fast path for: {query}")
+    return _passages(index, indices[:top_k], scores[:top_k])
+
+
+def lexical_fast_path(query: str, top_k=3, filters: dict = None):
+    """Texts of lexical_passages(), or None."""
+    passages = lexical_passages(query, top_k, filters)
+    return None if passages is None else [passage["text"] for passage in passages]
+
+
+def _fuse(index: ChunkIndex, query: str, vector_indices, top_k: int, rows=None):
+    """Reciprocal rank fusion of vector search results with BM25 results for the query."""
+    lexical_indices, _ = index.lexical.search(query, FUSION_CANDIDATES, rows=rows)
+    return reciprocal_rank_fusion([vector_indices, lexical_indices], top_k)
+
+
+def retrieve_passages(query_embedding, top_k=3, query: str = None, filters: dict = None) -> list:
+    """
+    Returns the top_k passages closest to an embedded query.
+    With the query text, vector and BM25 results are fused.
+    With filters (e.g. member_filters()), only chunks whose facets match are scored.
+    """
+    index = doc_index
+    rows = index.rows_matching(filters)
+    if rows is not None:
+        retrieval_stats["filtered"] += 1
+    if query is None or not HYBRID_RETRIEVAL or index.lexical is None:
+        retrieval_stats["vector"] += 1
+        indices, scores = index.search(query_embedding, top_k, rows=rows)
+    else:
+        retrieval_stats["hybrid"] += 1
+        vector_indices, _ = index.search(query_embedding, max(top_k, FUSION_CANDIDATES), rows=rows)
+        indices, scores = _fuse(index, query, vector_indices, top_k, rows=rows)
+    return _passages(index, indices, scores)
+
+
+def retrieve_by_embedding(query_embedding, top_k=3, query: str = None, filters: dict = None):
+    """Texts of retrieve_passages()."""
+    return [passage["text"] for passage in retrieve_passages(query_embedding, top_k, query, filters)]
+
+
+def build_context(passages: list, budget: int = CONTEXT_TOKEN_BUDGET, query: str = None) -> str:
+    """
+    Merges overlapping neighbor chunks, drops repeated table rows and
+    sentences and packs the passages into the token budget, cutting the
+    units with the fewest query words from a passage that does not fit.
+    """
+    def count_tokens(text):
+        return len(tokenizer.encode(text))
+
+    context, stats = pack_context(merge_neighbors(passages, tokenizer.decode), budget, count_tokens, query)
+    best = sorted(passages, key=lambda passage: passage["score"], reverse=True)[:BASELINE_CONTEXT_TOP_K]
+    original = count_tokens("\n\n".join(passage["text"] for passage in best))
+    saved = max(original - stats["context_tokens"], 0)
+    retrieval_stats["context_tokens"] += stats["context_tokens"]
+    retrieval_stats["context_tokens_saved"] += saved
+    logger.info(
+        f"Packed {stats['packed_passages']} of {stats['passages']} passages into {stats['context_tokens']} "
+        f"context tokens, {saved} of {original} prompt tokens saved"
+    )
+    return context
+
+
+async def retrieve_relevant_chunks(query: str, top_k=3, filters: dict = None):
     try:
         logger.info(f"Retrieving relevant chunks for: {query}")
-        query_embedding = (await embed_texts([query]))[0]
-        scored = [
-            (text, cosine_similarity(np.array(query_embedding), np.array(embed)))
-            for text, embed in doc_chunks
-        ]
-        scored.sort(key=lambda x: x[1], reverse=True)
-        top_chunks = [text for text, score in scored[:top_k]]
+        top_chunks = lexical_fast_path(query, top_k, filters)
+        if top_chunks is None:
+            query_embedding = (await embed_queries([query]))[0]
+            top_chunks = retrieve_by_embedding(query_embedding, top_k, query=query, filters=filters)
         logger.info(f"Top {top_k} chunks returned")
         return top_chunks
     except Exception as e:
         logger.error(f"Error in retrieve_relevant_chunks: {e}", exc_info=True)
         raise
+
+
+async def retrieve_relevant_chunks_batch(queries: list[str], top_k=3, filters: dict = None):
+    """Retrieves the top chunks for many queries with one embedding call and one matrix product."""
+    try:
+        logger.info(f"Retrieving relevant chunks for {len(queries)} queries")
+        index = doc_index
+        rows = index.rows_matching(filters)
+        query_embeddings = await embed_queries(queries)
+        if not HYBRID_RETRIEVAL or index.lexical is None:
+            retrieval_stats["vector"] += len(queries)
+            indices, _ = index.search_batch(query_embeddings, top_k, rows=rows)
+        else:
+            retrieval_stats["hybrid"] += len(queries)
+            vector_indices, _ = index.search_batch(query_embeddings, max(top_k, FUSION_CANDIDATES), rows=rows)
+            indices = [_fuse(index, query, row, top_k, rows=rows)[0] for query, row in zip(queries, vector_indices)]
+        return [[index.texts[i] for i in row if i >= 0] for row in indices]
+    except Exception as e:
+        logger.error(f"Error in retrieve_relevant_chunks_batch: {e}", exc_info=True)
+        raise
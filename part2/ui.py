@@ -2,6 +2,7 @@
 
 import gradio as gr
 import aiohttp
+import json
 import logging
 
 # Configure logging
@@ -22,43 +23,70 @@ class ChatState:
         self.phase = "collect_info"  # or "qa"
 
 
+async def read_events(response):
+    """Yields (event, data) pairs of a Server-Sent Events response."""
+    event, data = "message", []
+    async for line in response.content:
+        line = line.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+async def stream_reply(path, payload):
+    """Posts to a streaming endpoint and yields the reply text received so far."""
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{API_URL}{path}", json=payload) as response:
+            if response.status != 200:
+                error_msg = f"Error: {await response.text()}"
+                logger.error(f"Server error: {error_msg}")
+                raise Exception(error_msg)
+
+            reply = ""
+            async for event, data in read_events(response):
+                if event == "error":
+                    raise Exception(data["detail"])
+                if event == "done":
+                    return
+                reply += data["delta"]
+                yield reply
+
+
 async def send_chat_message(message, history, state):
-    """Send a message to the chat endpoint."""
+    """Send a message to the chat endpoint, showing the reply as it streams in."""
     try:
         logger.info(f"Processing chat message: {message}")
         state.messages.append({"role": "user", "content": message})
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{API_URL}/collect_info",
-                json={"messages": state.messages}
-            ) as response:
-
-                if response.status == 200:
-                    reply = (await response.json())["response"]
-                    state.messages.append({"role": "assistant", "content": reply})
-
-                    med_options = ["כללית", "מכבי", "מאוחדת", "clalit", "maccabi", "meuhedet"]
-                    if message.lower() in med_options:
-                        state.user_info["hmo"] = message.lower()
-                        logger.info(f"Updated HMO info: {message.lower()}")
-
-                    ab_options = ["זהב", "כסף", "ארד", "gold", "silver", "bronze"]
-                    if message.lower() in ab_options:
-                        state.user_info["tier"] = message.lower()
-                        state.phase = "qa"
-                        logger.info(f"Updated tier info: {message.lower()}, switching to QA phase")
-
-                    updated_history = history + [
-                        {"role": "user", "content": message},
-                        {"role": "assistant", "content": reply},
-                    ]
-                    logger.info("Successfully processed chat message")
-                    return updated_history, state
-
-                error_msg = f"Error: {await response.text()}"
-                logger.error(f"Server error: {error_msg}")
-                raise Exception(error_msg)
+        reply = ""
+        async for reply in stream_reply("/collect_info/stream", {"messages": state.messages}):
+            yield history + [
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": reply},
+            ], state
+        state.messages.append({"role": "assistant", "content": reply})
+
+        med_options = ["כללית", "מכבי", "מאוחדת", "clalit", "maccabi", "meuhedet"]
+        if message.lower() in med_options:
+            state.user_info["hmo"] = message.lower()
+            logger.info(f"Updated HMO info: {message.lower()}")
+
+        ab_options = ["זהב", "כסף", "ארד", "gold", "silver", "bronze"]
+        if message.lower() in ab_options:
+            state.user_info["tier"] = message.lower()
+            state.phase = "qa"
+            logger.info(f"Updated tier info: {message.lower()}, switching to QA phase")
+
+        logger.info("Successfully processed chat message")
+        yield history + [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": reply},
+        ], state
 
     except Exception as e:
         logger.error(f"Error in send_chat_message: {str(e)}", exc_info=True)
@@ -67,35 +95,20 @@ async def send_chat_message(message, history, state):
             {"role": "user", "content": message},
             {"role": "assistant", "content": error_msg},
         ]
-        return updated_history, state
+        yield updated_history, state
 
 
 async def send_question(message, history, state):
-    """Send a question to the QA endpoint."""
+    """Send a question to the QA endpoint, showing the answer as it streams in."""
     try:
         logger.info(f"Processing question: {message}")
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{API_URL}/ask",
-                json={
-                    "user_info": state.user_info,
-                    "question": message
-                }
-            ) as response:
-
-                if response.status == 200:
-                    reply = (await response.json())["answer"]
-                    logger.info("Successfully received answer")
-
-                    updated_history = history + [
-                        {"role": "user", "content": message},
-                        {"role": "assistant", "content": reply},
-                    ]
-                    return updated_history, state
-
-                error_msg = f"Error: {await response.text()}"
-                logger.error(f"Server error: {error_msg}")
-                raise Exception(error_msg)
+        payload = {"user_info": state.user_info, "question": message}
+        async for reply in stream_reply("/ask/stream", payload):
+            yield history + [
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": reply},
+            ], state
+        logger.info("Successfully received answer")
 
     except Exception as e:
         logger.error(f"Error in send_question: {str(e)}", exc_info=True)
@@ -104,7 +117,7 @@ async def send_question(message, history, state):
             {"role": "user", "content": message},
             {"role": "assistant", "content": error_msg},
         ]
-        return updated_history, state
+        yield updated_history, state
 
 
 async def chat_with_bot(message, history, state):
@@ -112,13 +125,15 @@ async def chat_with_bot(message, history, state):
     try:
         logger.info(f"Chat phase: {state.phase}")
         if state.phase == "collect_info":
-            return await send_chat_message(message, history, state)
+            updates = send_chat_message(message, history, state)
         else:
-            return await send_question(message, history, state)
+            updates = send_question(message, history, state)
+        async for update in updates:
+            yield update
     except Exception as e:
         logger.error(f"Error in chat_with_bot: {str(e)}", exc_info=True)
         error_msg = f"Error: {str(e)}"
-        return history + [
+        yield history + [
             {"role": "user", "content": message},
             {"role": "assistant", "content": error_msg},
         ], state
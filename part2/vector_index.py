@@ -0,0 +1,111 @@
+# part2_chatbot/vector_index.py
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(vectors) -> np.ndarray:
+    """Returns the vectors as float32 rows scaled to unit length."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def top_k(scores: np.ndarray, k: int):
+    """
+    Returns (indices, scores) of the k highest scores in every row, best first,
+    without sorting the whole row.
+    """
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+class ChunkIndex:
+    """
+    Chunk texts with a contiguous float32 matrix of their unit-normalized
+    embeddings; row i belongs to texts[i]. Cosine similarity is a dot product.
+    Searches are exact unless an approximate index over the same rows is
+    attached as `ann` (any object with search_batch(queries, k)). A lexical
+    index over the same rows can be attached as `lexical`, and the position of
+    every chunk in its document as `sources` (doc_id, start, end) with the
+    document tokens in `documents`. `facets` holds a metadata dict per row
+    for filtered searches, see rows_matching().
+    """
+
+    def __init__(self, texts: list, embeddings, version: str = ""):
+        self.texts = list(texts)
+        self.version = version
+        matrix = normalize(embeddings) if self.texts else np.empty((0, 0), dtype=np.float32)
+        self.matrix = np.ascontiguousarray(matrix)
+        self.ann = None
+        self.lexical = None
+        self.sources = None
+        self.documents = None
+        self.facets = None
+        self._filtered_rows = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def rows_matching(self, filters: dict):
+        """
+        Rows whose facets match all filters, as an index array. A row without
+        a facet, or with None, matches any value of it; filters set to None
+        are ignored. Returns None when nothing is filtered.
+        """
+        filters = {name: value for name, value in (filters or {}).items() if value is not None}
+        if not filters or self.facets is None:
+            return None
+        key = tuple(sorted(filters.items()))
+        rows = self._filtered_rows.get(key)
+        if rows is None:
+            rows = np.array([
+                row for row, facets in enumerate(self.facets)
+                if all(facets.get(name) in (None, value) for name, value in filters.items())
+            ], dtype=np.int64)
+            self._filtered_rows[key] = rows
+        return rows
+
+    def search(self, query, k: int, rows=None):
+        """
+        Scores one query embedding against all chunks, or only the given rows,
+        with a single matrix-vector product. Returns (indices, scores), best first.
+        """
+        if not self.texts or (rows is not None and not len(rows)):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if rows is not None:
+            # Filtered searches are exact over the selected rows
+            scores = self.matrix[rows] @ normalize(query)[0]
+            indices, top_scores = top_k(scores[None, :], k)
+            return rows[indices[0]], top_scores[0]
+        if self.ann is not None:
+            indices, scores = self.ann.search_batch(normalize(query), k)
+            return indices[0], scores[0]
+        scores = self.matrix @ normalize(query)[0]
+        indices, top_scores = top_k(scores[None, :], k)
+        return indices[0], top_scores[0]
+
+    def search_batch(self, queries, k: int, rows=None):
+        """
+        Scores many query embeddings at once with one matrix product, against
+        all chunks or only the given rows.
+        Returns (indices, scores) arrays of shape (queries, k), best first.
+        """
+        queries = normalize(queries)
+        if not self.texts or (rows is not None and not len(rows)):
+            return top_k(np.empty((len(queries), 0), dtype=np.float32), k)
+        if rows is not None:
+            indices, scores = top_k(queries @ self.matrix[rows].T, k)
+            return rows[indices], scores
+        if self.ann is not None:
+            return self.ann.search_batch(queries, k)
+        return top_k(queries @ self.matrix.T, k)
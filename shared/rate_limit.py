@@ -0,0 +1,307 @@
+# shared/rate_limit.py
+
+import os
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Priority classes, lower values are served first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", "1"))
+RATE_LIMIT_MAX_BACKOFF_SECONDS = 60.0
+
+# Azure enforces per-minute quotas over 10 second windows, so only that share may be used at once
+BURST_WINDOW_SECONDS = 10.0
+
+# How often a queued async caller re-checks its turn
+POLL_INTERVAL_SECONDS = 0.05
+
+# Default limits per service: (requests per minute, tokens per minute), set them to the deployment's quota.
+# Azure OpenAI grants 6 requests per minute for every 1000 tokens per minute of quota.
+DEFAULT_LIMITS = {
+    "openai": (None, 150000),
+    "embeddings": (None, 350000),
+    "form_recognizer": (900, None),
+}
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(level: int):
+    """
+    Sets the priority class of the calls made inside the block.
+    Threads start with the default (interactive) priority.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Refills continuously at limit_per_minute. The level may drop below zero
+    after a request larger than the bucket, which delays the next requests.
+    """
+
+    def __init__(self, limit_per_minute: float):
+        self.rate = limit_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * BURST_WINDOW_SECONDS)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken, 0 if it can be taken now."""
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+
+class RateLimiter:
+    """
+    Limits requests and tokens per minute for one service and retries
+    throttled or transient failures. Waiting callers are served in priority
+    order, then in arrival order. Works for threads and asyncio tasks.
+    """
+
+    def __init__(self, name: str, rpm: float = None, tpm: float = None, max_retries: int = RATE_LIMIT_MAX_RETRIES):
+        self.name = name
+        self.max_retries = max_retries
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._cancelled = set()
+        self._sequence = itertools.count()
+        self._blocked_until = 0.0
+        self._stats = {"requests": 0, "throttled": 0, "retries": 0, "wait_seconds": 0.0}
+
+    def _enqueue(self, priority) -> tuple:
+        ticket = (_priority.get() if priority is None else priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _cancel(self, ticket: tuple):
+        with self._condition:
+            self._cancelled.add(ticket)
+            self._condition.notify_all()
+
+    def _poll(self, ticket: tuple, tokens: int) -> float:
+        """
+        Admits the ticket when it is first in line and both buckets allow it.
+        Returns 0 when admitted, otherwise the seconds to wait before trying again.
+        Must be called with the condition held.
+        """
+        while self._waiting and self._waiting[0] in self._cancelled:
+            self._cancelled.discard(heapq.heappop(self._waiting))
+        if self._waiting[0] != ticket:
+            return POLL_INTERVAL_SECONDS
+        now = time.monotonic()
+        delay = self._blocked_until - now
+        if self._requests is not None:
+            delay = max(delay, self._requests.delay(1, now))
+        if self._tokens is not None:
+            delay = max(delay, self._tokens.delay(tokens, now))
+        if delay > 0:
+            return delay
+        if self._requests is not None:
+            self._requests.take(1)
+        if self._tokens is not None:
+            self._tokens.take(tokens)
+        heapq.heappop(self._waiting)
+        self._stats["requests"] += 1
+        self._condition.notify_all()
+        return 0.0
+
+    def acquire(self, tokens: int = 0, priority: int = None):
+        """Blocks the calling thread until the request may be sent."""
+        started = time.monotonic()
+        ticket = self._enqueue(priority)
+        try:
+            with self._condition:
+                while (delay := self._poll(ticket, tokens)) > 0:
+                    self._condition.wait(delay)
+                self._stats["wait_seconds"] += time.monotonic() - started
+        except BaseException:
+            self._cancel(ticket)
+            raise
+
+    async def acquire_async(self, tokens: int = 0, priority: int = None):
+        """Waits without blocking the event loop until the request may be sent."""
+        started = time.monotonic()
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    delay = self._poll(ticket, tokens)
+                    if delay == 0:
+                        self._stats["wait_seconds"] += time.monotonic() - started
+                        return
+                await asyncio.sleep(min(delay, POLL_INTERVAL_SECONDS))
+        except BaseException:
+            self._cancel(ticket)
+            raise
+
+    def _retry_delay(self, error: Exception, attempt: int):
+        """
+        Returns the seconds to wait before retrying, or None when the error is not retryable.
+        A 429 blocks all callers of this service until Retry-After has passed.
+        """
+        status = getattr(error, "status_code", None)
+        if status not in RETRY_STATUSES and not isinstance(error, _transient_errors()):
+            return None
+        if attempt >= self.max_retries:
+            return None
+        backoff = min(RATE_LIMIT_MAX_BACKOFF_SECONDS, RATE_LIMIT_BACKOFF_SECONDS * 2 ** attempt)
+        delay = backoff * random.uniform(0.5, 1.0)
+        with self._condition:
+            self._stats["retries"] += 1
+            if status == 429:
+                self._stats["throttled"] += 1
+                delay = retry_after(error) or delay
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+                return 0.0
+        return delay
+
+    def call(self, function, *args, tokens: int = 0, priority: int = None, **kwargs):
+        """Calls function(*args, **kwargs) within the limits, retrying throttled calls."""
+        for attempt in itertools.count():
+            self.acquire(tokens, priority)
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                logger.warning(f"{self.name} call failed ({str(e)}), retry {attempt + 1} of {self.max_retries}")
+                time.sleep(delay)
+
+    async def call_async(self, function, *args, tokens: int = 0, priority: int = None, **kwargs):
+        """Awaits function(*args, **kwargs) within the limits, retrying throttled calls."""
+        for attempt in itertools.count():
+            await self.acquire_async(tokens, priority)
+            try:
+                return await function(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                logger.warning(f"{self.name} call failed ({str(e)}), retry {attempt + 1} of {self.max_retries}")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._condition:
+            stats = dict(self._stats, waiting=len(self._waiting) - len(self._cancelled))
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        return stats
+
+
+def retry_after(error: Exception):
+    """Reads Retry-After (seconds) or retry-after-ms from the error's HTTP response."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return float(value) * scale
+        except ValueError:
+            # HTTP-date values fall back to exponential backoff
+            continue
+    return None
+
+
+def _transient_errors() -> tuple:
+    errors = [ConnectionError, TimeoutError]
+    try:
+        from openai import APIConnectionError
+        errors.append(APIConnectionError)
+    except ImportError:
+        pass
+    try:
+        from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+        errors.extend([ServiceRequestError, ServiceResponseError])
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+_encoding = None
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def estimate_tokens(*texts: str) -> int:
+    """
+    Counts tokens the way the quota does, with the o200k_base encoding.
+    Falls back to about four characters per token when tiktoken data is unavailable.
+    """
+    global _encoding
+    if _encoding is None:
+        with _registry_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable, estimating tokens from length: {str(e)}")
+                    _encoding = False
+    if _encoding is False:
+        return sum(len(text) for text in texts) // 4 + 1
+    return sum(len(_encoding.encode(text)) for text in texts)
+
+
+def message_tokens(messages: list, max_tokens: int = 0) -> int:
+    """Estimates the quota a chat request consumes: its messages plus the completion limit."""
+    return estimate_tokens(*(str(message.get("content", "")) for message in messages)) + max_tokens
+
+
+def get_limiter(name: str) -> RateLimiter:
+    """
+    Returns the process-wide limiter of a service, configured from
+    <NAME>_RPM and <NAME>_TPM (0 disables a limit).
+    """
+    with _registry_lock:
+        if name not in _limiters:
+            default_rpm, default_tpm = DEFAULT_LIMITS.get(name, (None, None))
+            tpm = float(os.getenv(f"{name.upper()}_TPM", default_tpm or 0))
+            rpm = float(os.getenv(f"{name.upper()}_RPM", default_rpm or tpm * 6 / 1000))
+            _limiters[name] = RateLimiter(name, rpm or None, tpm or None)
+            logger.info(f"Rate limiter {name}: {rpm or 'unlimited'} RPM, {tpm or 'unlimited'} TPM")
+        return _limiters[name]
+
+
+def limiter_stats() -> dict:
+    with _registry_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}